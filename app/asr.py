@@ -0,0 +1,394 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple, Union
+
+import soundfile as sf
+from vosk import KaldiRecognizer, Model
+
+from app import vad
+from app.audio_frontend import AudioFrontend, target_rate
+from app.metrics import observe_stages, observe_vad
+from app.vad import VoiceGate
+
+logger = logging.getLogger(__name__)
+
+# Размер блока чтения и подачи в распознаватель (в сэмплах)
+CHUNK_SAMPLES = int(os.getenv("ASR_BLOCK_SAMPLES", "16000"))
+
+# Сколько свободных распознавателей держать на одну частоту в процессе-воркере
+RECOGNIZERS_PER_RATE = 2
+
+# Окна для параллельного распознавания одной длинной записи
+SEGMENT_WINDOW_SECONDS = 60.0
+SEGMENT_OVERLAP_SECONDS = 5.0
+
+Word = Dict[str, Any]
+# Время этапов одного вызова: "audio_decode" (чтение звука) и "vosk_decode"
+Timings = Dict[str, float]
+# Работа детектора речи над файлом: "audio_seconds" и "skipped_seconds"
+GateStats = Dict[str, float]
+# Шаги iter_decode: (прочитано секунд, длительность файла, новые фразы)
+DecodeSteps = Generator[Tuple[float, float, List[str]], None, None]
+
+
+def _timed_blocks(blocks: Iterator[Any], convert: Callable[[Any], bytes], timings: Timings) -> Iterator[bytes]:
+    """Отдаёт блоки PCM для распознавателя; чтение, декодирование и convert идут в timings["audio_decode"]."""
+    while True:
+        t0 = time.perf_counter()
+        block = next(blocks, None)
+        pcm = convert(block) if block is not None else b""
+        timings["audio_decode"] = timings.get("audio_decode", 0.0) + time.perf_counter() - t0
+        if block is None:
+            return
+        if pcm:
+            yield pcm
+
+
+def _report(local: Timings, started: float, timings: Optional[Timings]) -> None:
+    # Всё, что не чтение звука, — работа распознавателя
+    local["vosk_decode"] = time.perf_counter() - started - local.get("audio_decode", 0.0)
+    if timings is None:
+        observe_stages(local)
+        return
+    for stage, seconds in local.items():
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def _report_gate(gate: Optional[VoiceGate], name: Any, stats: Optional[GateStats]) -> None:
+    if gate is None:
+        return
+    logger.info("%s: тишина %.0f%% из %.1f с не распознавалась",
+                name, gate.skipped_ratio * 100, gate.total_seconds)
+    local = {"audio_seconds": gate.total_seconds, "skipped_seconds": gate.skipped_seconds}
+    if stats is None:
+        observe_vad(local)
+    else:
+        stats.update(local)
+
+
+def decode_file(model: Model, filepath: Union[str, Path, IO[bytes]], rec: Optional[KaldiRecognizer] = None,
+                block_samples: int = CHUNK_SAMPLES, timings: Optional[Timings] = None,
+                gate_stats: Optional[GateStats] = None, use_vad: bool = vad.ENABLED) -> str:
+    """Распознаёт файл целиком и возвращает сырой текст без пунктуации.
+
+    Файл читается блоками, поэтому память не зависит от длины записи.
+    Каналы сводятся в моно, частота понижается до частоты модели (rec, если
+    передан, должен быть создан на target_rate(частота файла)). Длинная
+    тишина вырезается детектором речи, на долгих паузах фраза закрывается.
+    Время этапов добавляется в timings, доля тишины — в gate_stats, а без
+    них — сразу в метрики процесса.
+    """
+    steps = iter_decode(model, filepath, rec, block_samples, timings, gate_stats, use_vad)
+    return " ".join(text for _, _, texts in steps for text in texts)
+
+
+def iter_decode(model: Model, filepath: Union[str, Path, IO[bytes]], rec: Optional[KaldiRecognizer] = None,
+                block_samples: int = CHUNK_SAMPLES, timings: Optional[Timings] = None,
+                gate_stats: Optional[GateStats] = None, use_vad: bool = vad.ENABLED) -> DecodeSteps:
+    """То же, что decode_file, но по шагам: после каждого блока отдаёт
+    (прочитано секунд, длительность файла, фразы, закрытые на этом блоке).
+
+    Закрытая фраза Vosk уже не меняется, её можно сразу показывать. Если
+    генератор закрыть раньше времени, файл закрывается, а метрики не пишутся.
+    """
+    local: Timings = {}
+    started = time.perf_counter()
+    found: List[str] = []
+
+    def collect(raw: str) -> None:
+        text = json.loads(raw).get("text")
+        if text: found.append(text)
+
+    with sf.SoundFile(filepath) as f:
+        duration = f.frames / f.samplerate
+        frontend = AudioFrontend(f.samplerate, f.channels)
+        if rec is None:
+            rec = KaldiRecognizer(model, frontend.out_rate)
+        gate = VoiceGate(frontend.out_rate) if use_vad else None
+        blocks = f.blocks(blocksize=block_samples, dtype="int16", always_2d=True)
+        for pcm in _timed_blocks(blocks, frontend.process, local):
+            vad.feed(rec, gate, pcm, collect)
+            yield f.tell() / f.samplerate, duration, found
+            found = []
+    vad.flush(rec, gate, collect)
+    collect(rec.FinalResult())
+    _report(local, started, timings)
+    _report_gate(gate, getattr(filepath, "name", filepath), gate_stats)
+    yield duration, duration, found
+
+
+def decode_window(model: Model, filepath: Union[str, Path], start: int, stop: int,
+                  rec: Optional[KaldiRecognizer] = None, block_samples: int = CHUNK_SAMPLES,
+                  timings: Optional[Timings] = None) -> List[Word]:
+    """Распознаёт отрезок [start, stop) в сэмплах, возвращает слова с абсолютными временами.
+
+    Без детектора речи: вырезанная тишина сдвинула бы времена слов, а по ним
+    склеиваются окна.
+    """
+    words: List[Word] = []
+    local: Timings = {}
+    started = time.perf_counter()
+    with sf.SoundFile(filepath) as f:
+        frontend = AudioFrontend(f.samplerate, f.channels)
+        if rec is None:
+            rec = KaldiRecognizer(model, frontend.out_rate)
+        rec.SetWords(True)
+        offset = start / f.samplerate
+
+        def collect(raw: str) -> None:
+            for word in json.loads(raw).get("result", []):
+                word["start"] += offset
+                word["end"] += offset
+                words.append(word)
+
+        f.seek(start)
+        blocks = f.blocks(blocksize=block_samples, frames=stop - start, dtype="int16", always_2d=True)
+        for pcm in _timed_blocks(blocks, frontend.process, local):
+            if rec.AcceptWaveform(pcm):
+                collect(rec.Result())
+    collect(rec.FinalResult())
+    _report(local, started, timings)
+    return words
+
+
+def plan_windows(frames: int, samplerate: int, window_s: float = SEGMENT_WINDOW_SECONDS,
+                 overlap_s: float = SEGMENT_OVERLAP_SECONDS) -> List[Tuple[int, int]]:
+    """Нарезает запись на перекрывающиеся окна (в сэмплах)."""
+    window = int(window_s * samplerate)
+    step = window - int(overlap_s * samplerate)
+    if step <= 0:
+        raise ValueError("Перекрытие должно быть меньше окна")
+    windows = []
+    start = 0
+    while True:
+        stop = min(start + window, frames)
+        windows.append((start, stop))
+        if stop >= frames:
+            return windows
+        start += step
+
+
+def stitch_words(windows: List[Tuple[int, int]], words: List[List[Word]], samplerate: int) -> str:
+    """Склеивает слова окон, убирая дубли в перекрытиях.
+
+    Граница между соседними окнами — середина их перекрытия: слово относится
+    к тому окну, в чью половину попадает его центр.
+    """
+    cuts = [(windows[i][1] + windows[i + 1][0]) / 2 / samplerate for i in range(len(windows) - 1)]
+    result = []
+    for i, window_words in enumerate(words):
+        lo = cuts[i - 1] if i > 0 else float("-inf")
+        hi = cuts[i] if i < len(cuts) else float("inf")
+        for word in window_words:
+            center = (word["start"] + word["end"]) / 2
+            if lo <= center < hi:
+                result.append(word["word"])
+    return " ".join(result)
+
+
+class StreamingDecoder:
+    """Распознаёт PCM-поток в отдельном потоке по мере поступления данных.
+
+    Очередь ограничена: если распознавание не успевает, feed() блокирует
+    отправителя, и сеть притормаживает вместе с ним.
+    """
+
+    def __init__(self, model: Model, samplerate: int, max_pending: int = 32, channels: int = 1,
+                 use_vad: bool = vad.ENABLED) -> None:
+        # Приведение к моно и частоте модели идёт в потоке распознавания, вне event loop
+        self._frontend = AudioFrontend(samplerate, channels)
+        self._rec = KaldiRecognizer(model, self._frontend.out_rate)
+        self.gate = VoiceGate(self._frontend.out_rate) if use_vad else None
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_pending)
+        self._result: List[str] = []
+        self._error: Optional[BaseException] = None
+        self._cancelled = False
+        self.decode_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, pcm: bytes) -> None:
+        if pcm:
+            self._queue.put(pcm)
+
+    async def feed_async(self, pcm: bytes) -> None:
+        # Пока очередь не полна, обходимся без переключения в поток
+        try:
+            if pcm:
+                self._queue.put_nowait(pcm)
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, pcm)
+
+    def finish(self) -> str:
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        observe_stages({"vosk_decode": self.decode_seconds})
+        _report_gate(self.gate, "поток", None)
+        return " ".join(self._result)
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _collect(self, raw: str) -> None:
+        text = json.loads(raw).get("text")
+        if text: self._result.append(text)
+
+    def _run(self) -> None:
+        try:
+            while (data := self._queue.get()) is not None and not self._cancelled:
+                t0 = time.perf_counter()
+                pcm = self._frontend.process_bytes(data)
+                if pcm:
+                    vad.feed(self._rec, self.gate, pcm, self._collect)
+                self.decode_seconds += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            vad.flush(self._rec, self.gate, self._collect)
+            self._collect(self._rec.FinalResult())
+            self.decode_seconds += time.perf_counter() - t0
+        except Exception as e:
+            self._error = e
+            # Разгружаем очередь, чтобы отправитель не завис на put()
+            while not self._cancelled and self._queue.get() is not None:
+                pass
+
+
+# -------------------- ПРОЦЕСС-ВОРКЕР --------------------
+# Состояние живёт в каждом дочернем процессе отдельно
+_worker_model: Optional[Model] = None
+# Ключ — (частота, выдавать ли слова с таймкодами)
+_worker_recognizers: Dict[Tuple[int, bool], List[KaldiRecognizer]] = {}
+
+
+def _init_worker(model_path: str, nice: int = 0) -> None:
+    global _worker_model
+    if nice:
+        # Пул фоновой работы уступает процессор пулу запросов
+        os.nice(nice)
+    # После fork из процесса с реестром моделей берём уже загруженную (общую copy-on-write);
+    # иначе грузим сами. Замки реестра не трогаем: fork мог застать их занятыми потоком
+    # загрузки родителя, и в дочернем процессе их уже никто не отпустит
+    registry_module = sys.modules.get("app.registry")
+    model = registry_module.registry.loaded_vosk(model_path) if registry_module else None
+    _worker_model = model if model is not None else Model(model_path)
+    logger.info("Воркер %d: модель Vosk готова", os.getpid())
+
+
+def _acquire_recognizer(samplerate: int, words: bool = False) -> KaldiRecognizer:
+    free = _worker_recognizers.get((samplerate, words))
+    if free:
+        return free.pop()
+    rec = KaldiRecognizer(_worker_model, samplerate)
+    rec.SetWords(words)
+    return rec
+
+
+def _release_recognizer(samplerate: int, rec: KaldiRecognizer, words: bool = False) -> None:
+    free = _worker_recognizers.setdefault((samplerate, words), [])
+    if len(free) < RECOGNIZERS_PER_RATE:
+        rec.Reset()
+        free.append(rec)
+
+
+# Воркеры возвращают время этапов вместе с результатом: метрики живут в основном процессе
+def _decode_in_worker(filepath: str) -> Tuple[str, Timings, GateStats]:
+    samplerate = target_rate(sf.info(filepath).samplerate)
+    rec = _acquire_recognizer(samplerate)
+    timings: Timings = {}
+    gate_stats: GateStats = {}
+    try:
+        return decode_file(_worker_model, filepath, rec, timings=timings, gate_stats=gate_stats), timings, gate_stats
+    finally:
+        _release_recognizer(samplerate, rec)
+
+
+def _decode_window_in_worker(filepath: str, start: int, stop: int) -> Tuple[List[Word], Timings]:
+    samplerate = target_rate(sf.info(filepath).samplerate)
+    rec = _acquire_recognizer(samplerate, words=True)
+    timings: Timings = {}
+    try:
+        return decode_window(_worker_model, filepath, start, stop, rec, timings=timings), timings
+    finally:
+        _release_recognizer(samplerate, rec, words=True)
+
+
+class VoskExecutor:
+    """Пул процессов, в каждом из которых загружена своя копия модели Vosk.
+
+    Число одновременно отправленных в пул файлов ограничено max_inflight:
+    остальные вызовы decode() ждут, не раздувая очередь пула. nice > 0
+    понижает приоритет процессов пула (пул фонового уточнения).
+    """
+
+    def __init__(self, model_path: str, processes: int, max_inflight: Optional[int] = None, nice: int = 0) -> None:
+        self.model_path = model_path
+        self.processes = processes
+        self.max_inflight = max_inflight or processes * 2
+        self.nice = nice
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self.active = 0
+
+    def start(self) -> None:
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_worker,
+            initargs=(self.model_path, self.nice),
+        )
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        logger.info("Пул Vosk %s: %d процессов (nice %d), до %d файлов в работе",
+                    self.model_path, self.processes, self.nice, self.max_inflight)
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def decode(self, filepath: Union[str, Path]) -> str:
+        result: Tuple[str, Timings, GateStats] = await self._run(_decode_in_worker, str(filepath))
+        text, timings, gate_stats = result
+        observe_stages(timings)
+        if gate_stats:
+            observe_vad(gate_stats)
+        return text
+
+    async def decode_segmented(self, filepath: Union[str, Path], window_s: float = SEGMENT_WINDOW_SECONDS,
+                               overlap_s: float = SEGMENT_OVERLAP_SECONDS) -> str:
+        """Распознаёт одну длинную запись параллельно по перекрывающимся окнам."""
+        info = sf.info(str(filepath))
+        windows = plan_windows(info.frames, info.samplerate, window_s, overlap_s)
+        results = await asyncio.gather(*(
+            self._run(_decode_window_in_worker, str(filepath), start, stop) for start, stop in windows
+        ))
+        words = []
+        total: Timings = {}
+        for window_words, timings in results:
+            words.append(window_words)
+            for stage, seconds in timings.items():
+                total[stage] = total.get(stage, 0.0) + seconds
+        observe_stages(total)
+        return stitch_words(windows, words, info.samplerate)
+
+    async def _run(self, fn: Any, *args: Any) -> Any:
+        if self._executor is None or self._inflight is None:
+            raise RuntimeError("VoskExecutor не запущен")
+        async with self._inflight:
+            self.active += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, fn, *args)
+            finally:
+                self.active -= 1
@@ -0,0 +1,124 @@
+from math import gcd
+from typing import Optional
+
+import numpy as np
+
+# Частота, на которой обучена модель Vosk: всё, что выше, понижаем до неё
+MODEL_RATE = 16000
+
+# Длина фильтра в нулях sinc по каждую сторону от центра (на частоте выхода):
+# больше — круче срез и меньше наложения спектров, дороже свёртка
+ZERO_CROSSINGS = 16
+
+
+def target_rate(samplerate: int, model_rate: int = MODEL_RATE) -> int:
+    """Частота, с которой звук уходит в распознаватель.
+
+    Выше частоты модели — понижаем; ниже (8 кГц телефония) оставляем как есть:
+    повышение не добавит информации, а Kaldi сам приведёт частоту.
+    """
+    return model_rate if samplerate > model_rate else samplerate
+
+
+def downmix(block: np.ndarray) -> np.ndarray:
+    """(frames, channels) или (frames,) -> моно float32 в шкале int16."""
+    if block.ndim == 1:
+        return block.astype(np.float32, copy=False)
+    if block.shape[1] == 1:
+        return block[:, 0].astype(np.float32, copy=False)
+    mono: np.ndarray = block.mean(axis=1, dtype=np.float32)
+    return mono
+
+
+def taps_per_phase(up: int, down: int, zero_crossings: int = ZERO_CROSSINGS) -> int:
+    # При понижении частоты фильтр должен накрыть во столько же раз больше входных отсчётов
+    return int(np.ceil(2 * zero_crossings * max(1.0, down / up)))
+
+
+def design_filter(up: int, down: int, taps: int) -> np.ndarray:
+    """Прототип ФНЧ (sinc с окном Кайзера), разложенный на up фаз.
+
+    Возвращает матрицу (up, taps): строка p — коэффициенты фазы p в порядке
+    от свежего отсчёта к старому.
+    """
+    cutoff = 0.95 / max(up, down)  # доля от частоты Найквиста повышенного потока
+    n = up * taps
+    t = np.arange(n) - (n - 1) / 2
+    h = cutoff * np.sinc(cutoff * t) * np.kaiser(n, 8.0)
+    h *= up / h.sum()
+    # h[k * up + p] — коэффициент фазы p для отсчёта x[base - k]
+    phases: np.ndarray = h.reshape(taps, up).T.astype(np.float32).copy()
+    return phases
+
+
+class Resampler:
+    """Потоковый полифазный передискретизатор in_rate -> out_rate.
+
+    Выходной отсчёт n берётся из входного base = n*down // up с фазой
+    n*down % up. Все выходы блока считаются одной векторной операцией:
+    окна входа собираются индексами, а не циклом. Между блоками хранится
+    хвост входа длиной в фильтр, поэтому стыки блоков не слышны.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, zero_crossings: int = ZERO_CROSSINGS) -> None:
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self._taps = taps_per_phase(self.up, self.down, zero_crossings)
+        self._filter = design_filter(self.up, self.down, self._taps)
+        self._history = np.zeros(self._taps - 1, dtype=np.float32)
+        self._consumed = 0  # сколько входных отсчётов уже видели
+        self._produced = 0  # сколько выходных отсчётов уже отдали
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        if self.up == self.down:
+            return x
+        if not len(x):
+            return x[:0]
+        buf = np.concatenate((self._history, x))
+        first_abs = self._consumed - len(self._history)  # абсолютный индекс buf[0]
+        self._consumed += len(x)
+        end = (self._consumed * self.up + self.down - 1) // self.down
+        n = np.arange(self._produced, end, dtype=np.int64)
+        self._produced = end
+        base = n * self.down // self.up - first_abs
+        phase = n * self.down % self.up
+        windows = buf[base[:, None] - np.arange(self._taps)]
+        y: np.ndarray = np.einsum("ij,ij->i", windows, self._filter[phase])
+        self._history = buf[len(buf) - (self._taps - 1):]
+        return y
+
+
+class AudioFrontend:
+    """Приводит блоки звука к тому, что нужно распознавателю: моно int16 PCM на target_rate."""
+
+    def __init__(self, samplerate: int, channels: int = 1, model_rate: int = MODEL_RATE) -> None:
+        self.samplerate = samplerate
+        self.channels = channels
+        self.out_rate = target_rate(samplerate, model_rate)
+        self._resampler: Optional[Resampler] = (
+            Resampler(samplerate, self.out_rate) if self.out_rate != samplerate else None
+        )
+
+    @property
+    def passthrough(self) -> bool:
+        return self.channels == 1 and self._resampler is None
+
+    def process(self, block: np.ndarray) -> bytes:
+        """Блок (frames,) или (frames, channels) int16 -> байты моно PCM16."""
+        if self.passthrough:
+            return np.ascontiguousarray(block, dtype=np.int16).tobytes()
+        mono = downmix(block)
+        if self._resampler is not None:
+            mono = self._resampler.process(mono)
+        pcm: bytes = np.clip(np.rint(mono), -32768, 32767).astype(np.int16).tobytes()
+        return pcm
+
+    def process_bytes(self, pcm: bytes) -> bytes:
+        """Перемежающийся PCM16 (как из WAV или микрофона) -> моно PCM16 на out_rate."""
+        if self.passthrough or not pcm:
+            return pcm
+        samples = np.frombuffer(pcm, dtype="<i2")
+        return self.process(samples.reshape(-1, self.channels) if self.channels > 1 else samples)
@@ -0,0 +1,203 @@
+"""Пакетная транскрипция без веб-сервера и БД.
+
+Входы — каталоги (обходятся рекурсивно, берутся файлы с аудио-расширениями)
+и манифесты: текстовый файл, где каждая строка — путь (относительно
+манифеста) или JSON с полем "path". Vosk работает в пуле процессов,
+пунктуация — общим батчером в основном процессе. Результат дописывается в
+JSONL по строке на файл; при перезапуске файлы, уже записанные со статусом
+done, пропускаются.
+
+Запуск: python -m app.cli audio/ manifest.txt --out transcripts.jsonl [--processes N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Sequence, Set
+
+import soundfile as sf
+
+from app.asr import VoskExecutor
+from app.pipeline import Pipeline
+from app.punct_batcher import PunctuationBatcher
+from app.registry import registry
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".oga", ".opus", ".mp3", ".aif", ".aiff")
+# Как часто печатать прогресс, секунд
+PROGRESS_INTERVAL = 30.0
+
+
+def read_manifest(path: Path) -> Iterator[str]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = Path(json.loads(line)["path"] if line.startswith("{") else line)
+            yield str(item if item.is_absolute() else path.parent / item)
+
+
+def iter_inputs(sources: Sequence[str], extensions: Sequence[str] = AUDIO_EXTENSIONS) -> Iterator[str]:
+    """Пути к файлам по порядку; каталоги обходятся лениво, без полного списка в памяти."""
+    for source in sources:
+        path = Path(source)
+        if not path.is_dir():
+            yield from read_manifest(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(tuple(extensions)):
+                    yield os.path.join(root, name)
+
+
+def load_done(out: Path) -> Set[str]:
+    """Пути, уже распознанные в прошлых запусках."""
+    done: Set[str] = set()
+    if not out.exists():
+        return done
+    with open(out, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # строка, оборванная при падении
+            if record.get("status") == "done":
+                done.add(record["path"])
+    return done
+
+
+def open_output(out: Path) -> IO[str]:
+    # Если прошлый запуск оборвался посреди строки, новая запись начнётся с новой строки
+    if out.exists() and out.stat().st_size:
+        with open(out, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return open(out, "a", encoding="utf-8", buffering=1)
+
+
+class BatchRunner:
+    """Гонит поток путей через конвейер, держа в работе до concurrency файлов."""
+
+    def __init__(self, pipeline: Pipeline, output: IO[str], concurrency: int, punctuate: bool = True) -> None:
+        self.pipeline = pipeline
+        self.output = output
+        self.concurrency = concurrency
+        self.punctuate = punctuate
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self._started = time.perf_counter()
+        self._last_report = self._started
+
+    async def run(self, paths: Iterable[str]) -> None:
+        source = iter(paths)
+
+        async def worker() -> None:
+            # Итератор общий: next() синхронный, поэтому файл достаётся ровно одному воркеру
+            for path in source:
+                self._write(await self.process(path))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self.report()
+
+    async def process(self, path: str) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            duration = (await asyncio.to_thread(sf.info, path)).duration
+            raw = await self.pipeline.decode(path, duration)
+            # Сбой пунктуации — ошибка файла: иначе при перезапуске он не повторится
+            text = await self.pipeline.batcher.punctuate_async(raw) if self.punctuate and raw else raw
+        except Exception as e:
+            return {"path": path, "status": "error", "error": f"{type(e).__name__}: {e}"}
+        return {"path": path, "status": "done", "text": text, "raw": raw, "duration": round(duration, 3),
+                "elapsed": round(time.perf_counter() - t0, 3)}
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if record["status"] == "done":
+            self.done += 1
+            self.audio_seconds += record["duration"]
+        else:
+            self.failed += 1
+            logger.warning("%s: %s", record["path"], record["error"])
+        if time.perf_counter() - self._last_report >= PROGRESS_INTERVAL:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = time.perf_counter()
+        wall = self._last_report - self._started
+        speed = self.audio_seconds / wall if wall else 0.0
+        print(f"готово {self.done}, ошибок {self.failed}, аудио {self.audio_seconds / 3600:.2f} ч "
+              f"за {wall / 60:.1f} мин (x{speed:.1f} реального времени)", file=sys.stderr)
+
+
+async def run(args: argparse.Namespace) -> int:
+    out = Path(args.out)
+    done = load_done(out)
+    if done:
+        print(f"уже распознано в {out}: {len(done)}, пропускаем", file=sys.stderr)
+
+    def pending() -> Iterator[str]:
+        # done пополняется по ходу: файл, указанный дважды, распознаётся один раз
+        for path in iter_inputs(args.inputs, args.extensions):
+            if path not in done:
+                done.add(path)
+                yield path
+
+    executor: Optional[VoskExecutor] = None
+    if args.processes > 0:
+        # Модель загружается до запуска пула: при fork воркеры получат её copy-on-write
+        registry.vosk()
+        executor = VoskExecutor(registry.vosk_path, args.processes, args.inflight or args.processes * 2)
+        executor.start()
+    batcher = PunctuationBatcher(lambda: registry.classifier, max_batch=args.punct_batch)
+    pipeline = Pipeline(registry, batcher, executor, segment_min_seconds=args.segment_min_seconds)
+    concurrency = args.concurrency or (executor.max_inflight * 2 if executor else 2)
+    try:
+        with open_output(out) as output:
+            runner = BatchRunner(pipeline, output, concurrency, punctuate=not args.no_punct)
+            await runner.run(pending())
+    finally:
+        if executor is not None:
+            executor.stop()
+        pipeline.batcher.stop()
+    return 1 if runner.failed else 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="каталоги с аудио и/или файлы-манифесты")
+    parser.add_argument("--out", default="transcripts.jsonl", help="JSONL с результатами (дописывается)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="процессов Vosk; 0 — распознавать в потоках основного процесса")
+    parser.add_argument("--inflight", type=int, default=0, help="файлов в пуле одновременно (по умолчанию 2 на процесс)")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="файлов в работе всего, включая ожидающие пунктуацию")
+    parser.add_argument("--punct-batch", type=int, default=32, help="окон в одном батче пунктуации")
+    parser.add_argument("--no-punct", action="store_true", help="только сырой текст Vosk")
+    parser.add_argument("--segment-min-seconds", type=float, default=0.0,
+                        help="записи не короче этого распознавать параллельно по окнам (0 — никогда)")
+    parser.add_argument("--extensions", nargs="+", default=list(AUDIO_EXTENSIONS))
+    parser.add_argument("--model", help="каталог модели Vosk (по умолчанию VOSK_MODEL_PATH)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.model:
+        registry.vosk_path = args.model
+    try:
+        sys.exit(asyncio.run(run(args)))
+    except KeyboardInterrupt:
+        print("прервано; готовые файлы уже в выходном JSONL", file=sys.stderr)
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,156 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Select, func, insert, select, tuple_, update
 from app.models import AudioFile
-from app.schemas import AudioFileSchema
+from app.schemas import AudioFileSchema, AudioFilePage, AudioFileSummary
+from app.metrics import timed
 import msgspec
 
+# Поля для списков и поиска: без транскрипции и search_vector, длинный текст не читается ради страницы
+_LIST_COLUMNS: Tuple[Any, ...] = (AudioFile.id, AudioFile.url, AudioFile.status, AudioFile.created_at, AudioFile.refine_status)
+
+# Фрагменты текста вокруг совпадений для выдачи поиска
+SNIPPET_OPTIONS = "MaxFragments=2, MinWords=5, MaxWords=20, StartSel=«, StopSel=», FragmentDelimiter=\" … \""
+
+
+def _to_schema(audio: AudioFile) -> AudioFileSchema:
+    return AudioFileSchema(
+        id=audio.id,
+        url=audio.url,
+        status=audio.status,
+        transcription=audio.transcription,
+        created_at=audio.created_at,
+        draft_transcription=audio.draft_transcription,
+        refine_status=audio.refine_status,
+    )
+
+
 async def get_audio_json(session: AsyncSession, file_id: int) -> bytes:
     result = await session.execute(select(AudioFile).where(AudioFile.id == file_id))
     audio = result.scalar_one_or_none()
     if not audio:
         return msgspec.json.encode({"error": "Not found"})
-    schema = AudioFileSchema(
-        id=audio.id,
-        url=audio.url,
-        status=audio.status,
-        transcription=audio.transcription,
+    with timed("response_encode"):
+        return msgspec.json.encode(_to_schema(audio))
+
+
+# -------------------- СПИСКИ С КУРСОРОМ --------------------
+def encode_cursor(created_at: datetime, file_id: int) -> str:
+    raw = msgspec.json.encode((created_at, file_id))
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key: Tuple[datetime, int] = msgspec.json.decode(raw, type=Tuple[datetime, int])
+        return key
+    except (ValueError, msgspec.DecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+async def _page_json(session: AsyncSession, query: Select[Any], cursor: Optional[str], limit: int) -> bytes:
+    """Страница по ключу (created_at, id) от новых к старым, без OFFSET.
+
+    Следующая страница начинается строго после последней строки текущей,
+    поэтому запрос идёт по индексу ix_audio_files_created_at_id (или
+    ix_audio_files_status_created_at_id при фильтре по статусу) с любого места.
+    """
+    if cursor:
+        query = query.where(tuple_(AudioFile.created_at, AudioFile.id) < decode_cursor(cursor))
+    query = query.order_by(AudioFile.created_at.desc(), AudioFile.id.desc()).limit(limit + 1)
+    rows = (await session.execute(query)).all()
+    items = [AudioFileSummary(id=r.id, url=r.url, status=r.status, created_at=r.created_at,
+                              refine_status=r.refine_status, snippet=r._mapping.get("snippet"))
+             for r in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    with timed("response_encode"):
+        return msgspec.json.encode(AudioFilePage(items=items, next_cursor=next_cursor))
+
+
+async def list_audio_json(session: AsyncSession, status: Optional[str] = None, cursor: Optional[str] = None,
+                          limit: int = 50) -> bytes:
+    query = select(*_LIST_COLUMNS)
+    if status:
+        query = query.where(AudioFile.status == status)
+    return await _page_json(session, query, cursor, limit)
+
+
+async def search_audio_json(session: AsyncSession, text: str, cursor: Optional[str] = None, limit: int = 50) -> bytes:
+    """Полнотекстовый поиск по транскрипциям (синтаксис websearch: "фраза", -слово, or).
+
+    Вместо полного текста строка несёт snippet — фрагменты с совпадениями (ts_headline).
+    """
+    tsquery = func.websearch_to_tsquery("russian", text)
+    snippet = func.ts_headline("russian", AudioFile.transcription, tsquery, SNIPPET_OPTIONS).label("snippet")
+    query = select(*_LIST_COLUMNS, snippet).where(AudioFile.search_vector.bool_op("@@")(tsquery))
+    return await _page_json(session, query, cursor, limit)
+
+
+async def get_audio(session: AsyncSession, file_id: int) -> Optional[AudioFile]:
+    result = await session.execute(select(AudioFile).where(AudioFile.id == file_id))
+    return result.scalar_one_or_none()
+
+
+async def create_audio(session: AsyncSession, url: str, status: str = "queued", transcription: Optional[str] = None,
+                       content_hash: Optional[str] = None, model_version: Optional[str] = None, **fields: Any) -> int:
+    """Новая строка audio_files; fields — прочие колонки (например, поля черновика)."""
+    audio = AudioFile(url=url, status=status, transcription=transcription,
+                      content_hash=content_hash, model_version=model_version, **fields)
+    session.add(audio)
+    await session.commit()
+    return audio.id
+
+
+async def create_audio_batch(session: AsyncSession, urls: List[str], status: str = "queued") -> List[int]:
+    """Вставляет все строки одним многострочным INSERT ... RETURNING id."""
+    if not urls:
+        return []
+    result = await session.execute(
+        insert(AudioFile).values([{"url": url, "status": status} for url in urls]).returning(AudioFile.id)
+    )
+    await session.commit()
+    return list(result.scalars())
+
+
+async def find_transcription(session: AsyncSession, content_hash: str, model_version: str) -> Optional[str]:
+    """Готовая транскрипция того же звука, распознанного теми же моделями."""
+    result = await session.execute(
+        select(AudioFile.transcription)
+        .where(AudioFile.content_hash == content_hash, AudioFile.model_version == model_version,
+               AudioFile.status == "done", AudioFile.transcription.is_not(None))
+        .order_by(AudioFile.id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def apply_updates(session: AsyncSession, updates: List[Dict[str, Any]]) -> None:
+    """Применяет пачку обновлений строк (словари с "id") одной транзакцией.
+
+    Несколько обновлений одной строки сливаются, более позднее побеждает;
+    строки с одинаковым набором полей уходят одним executemany.
+    """
+    merged: Dict[int, Dict[str, Any]] = {}
+    for values in updates:
+        merged.setdefault(values["id"], {}).update(values)
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for values in merged.values():
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+    for rows in groups.values():
+        await session.execute(update(AudioFile), rows)
+    await session.commit()
+
+
+async def get_pending_jobs(session: AsyncSession, column: str = "status") -> List[Tuple[int, str]]:
+    """Задачи (id, url), не доведённые до конца (например, после перезапуска сервера).
+
+    column — поле со статусом очереди: status у распознавания, refine_status у уточнения.
+    """
+    status = getattr(AudioFile, column)
+    result = await session.execute(
+        select(AudioFile.id, AudioFile.url).where(status.in_(("queued", "processing"))).order_by(AudioFile.id)
     )
-    return msgspec.json.encode(schema)
+    return [(row.id, row.url) for row in result]
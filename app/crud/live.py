@@ -0,0 +1,52 @@
+from typing import Any, Dict, List, Tuple
+
+import msgspec
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import timed
+from app.models import LiveSegment
+from app.schemas import LiveSegmentPage, LiveSegmentSchema
+
+
+async def save_segments(session: AsyncSession, segments: List[Dict[str, Any]]) -> None:
+    """Пишет пачку фраз одним INSERT ... ON CONFLICT.
+
+    Записи — {"session_id", "position", "seq", "text"}. Исправление фразы
+    приходит с той же позицией и бо́льшим seq; если в пачке их несколько,
+    остаётся последнее, а в БД правка не перезаписывается более старой.
+    """
+    latest: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for segment in segments:
+        key = (segment["session_id"], segment["position"])
+        if key not in latest or segment["seq"] > latest[key]["seq"]:
+            latest[key] = segment
+    if not latest:
+        return
+    stmt = insert(LiveSegment).values(list(latest.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LiveSegment.session_id, LiveSegment.position],
+        set_={"seq": stmt.excluded.seq, "text": stmt.excluded.text},
+        where=LiveSegment.seq < stmt.excluded.seq,
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def get_segments(session: AsyncSession, session_id: str, after: int = 0, limit: int = 500) -> LiveSegmentPage:
+    """Фразы сессии, изменённые после курсора after, в порядке изменений."""
+    result = await session.execute(
+        select(LiveSegment.position, LiveSegment.seq, LiveSegment.text)
+        .where(LiveSegment.session_id == session_id, LiveSegment.seq > after)
+        .order_by(LiveSegment.seq)
+        .limit(limit)
+    )
+    items = [LiveSegmentSchema(index=r.position, seq=r.seq, text=r.text) for r in result]
+    return LiveSegmentPage(session_id=session_id, segments=items, next=items[-1].seq if items else after)
+
+
+async def get_segments_json(session: AsyncSession, session_id: str, after: int = 0, limit: int = 500) -> bytes:
+    page = await get_segments(session, session_id, after, limit)
+    with timed("response_encode"):
+        return msgspec.json.encode(page)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Сколько записей максимум в одной транзакции и сколько ждать попутчиков, секунд
+MAX_BATCH = 256
+MAX_DELAY = 0.005
+
+Flush = Callable[[AsyncSession, List[T]], Awaitable[None]]
+# Запись и future её фиксации (None — для записей из submit_threadsafe)
+Entry = Tuple[T, "Optional[asyncio.Future[None]]"]
+
+
+class GroupCommitWriter(Generic[T]):
+    """Групповая фиксация: записи от многих источников уходят в БД пачками.
+
+    submit() ставит запись в очередь и возвращает future, который завершится
+    после COMMIT транзакции с этой записью; submit_threadsafe() — то же из
+    любого потока, без ожидания и без future. Фоновая задача собирает записи,
+    пока не наберётся max_batch или не истечёт max_delay с первой, и вызывает
+    flush(session, items) — одна транзакция на всю пачку.
+    """
+
+    def __init__(self, flush: Flush[T], max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY,
+                 name: str = "group-commit") -> None:
+        self._flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.name = name
+        self._queue: "Optional[asyncio.Queue[Optional[Entry[T]]]]" = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: "Optional[asyncio.Task[None]]" = None
+        self.transactions = 0
+        self.items = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        """Дописывает всё, что уже в очереди, и останавливает задачу."""
+        if self._task is None or self._queue is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._queue = None
+        self._loop = None
+
+    def submit(self, item: T) -> "asyncio.Future[None]":
+        if self._task is None or self._queue is None:
+            raise RuntimeError(f"{self.name} не запущен")
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return future
+
+    def submit_threadsafe(self, item: T) -> None:
+        """Ставит запись из любого потока и сразу возвращается: вызывающий не ждёт ни очередь, ни БД."""
+        loop, queue = self._loop, self._queue
+        if loop is None or queue is None:
+            raise RuntimeError(f"{self.name} не запущен")
+        loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+
+    async def write(self, item: T) -> None:
+        await self.submit(item)
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            stopping = False
+            deadline = asyncio.get_running_loop().time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    # Сначала забираем то, что уже накопилось, потом ждём до дедлайна
+                    entry = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - asyncio.get_running_loop().time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._commit(batch)
+            if stopping:
+                return
+
+    async def _commit(self, batch: "List[Entry[T]]") -> None:
+        try:
+            async with async_session() as session:
+                await self._flush(session, [item for item, _ in batch])
+        except Exception as e:
+            logger.exception("Сбой групповой записи %s (%d записей)", self.name, len(batch))
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        self.transactions += 1
+        self.items += len(batch)
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Пул соединений общей сессии: всего и на один хост
+DOWNLOAD_CONNECTIONS = 64
+DOWNLOAD_PER_HOST = 8
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def is_remote(url: str) -> bool:
+    return urlsplit(url).scheme in ("http", "https")
+
+
+def url_filename(url: str) -> str:
+    return Path(urlsplit(url).path).name or "download"
+
+
+class Downloader:
+    """Потоковое скачивание аудио через одну общую aiohttp-сессию.
+
+    Соединения переиспользуются между задачами (keep-alive), их число
+    ограничено и в целом, и на каждый хост. Сбои соединения и ответы из
+    RETRY_STATUSES повторяются с экспоненциальной паузой, но только пока
+    тело ещё не начало передаваться: дальше байты уже ушли в распознаватель.
+    """
+
+    def __init__(self, connections: int = DOWNLOAD_CONNECTIONS, per_host: int = DOWNLOAD_PER_HOST,
+                 retries: int = DOWNLOAD_RETRIES, timeout: float = 300.0, backoff: float = 0.5) -> None:
+        self.connections = connections
+        self.per_host = per_host
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.downloads = 0
+        self.retried = 0
+        self.failed = 0
+        self.bytes = 0
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.connections, limit_per_host=self.per_host, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout, sock_connect=10)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, raise_for_status=False)
+
+    async def stop(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get(self, url: str) -> aiohttp.ClientResponse:
+        if self._session is None:
+            await self.start()
+        assert self._session is not None
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._session.get(url)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.info("Повтор %s после ошибки соединения: %s", url, e)
+            else:
+                if response.status not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+                response.release()
+                logger.info("Повтор %s после ответа %d", url, response.status)
+            self.retried += 1
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+        raise RuntimeError("unreachable")
+
+    async def stream(self, url: str, chunk_bytes: int = DOWNLOAD_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        """Отдаёт тело ответа чанками по мере прихода из сети."""
+        try:
+            response = await self._get(url)
+        except Exception:
+            self.failed += 1
+            raise
+        try:
+            async for chunk in response.content.iter_chunked(chunk_bytes):
+                self.bytes += len(chunk)
+                yield chunk
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            response.release()
+        self.downloads += 1
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from app.crud import audio as audio_crud
+from app.database import async_session
+from app.group_commit import GroupCommitWriter
+from app.scheduler import JobScheduler, probe_duration
+
+logger = logging.getLogger(__name__)
+
+# Обработчик получает AudioFile.url и возвращает готовую транскрипцию
+# либо поля строки, которые записываются вместе со статусом done
+JobResult = Union[str, Dict[str, Any]]
+JobHandler = Callable[[str], Awaitable[JobResult]]
+# Вызывается после записи done: (id, длительность или None, записанные поля)
+JobDone = Callable[[int, Optional[float], Dict[str, Any]], None]
+
+
+class JobQueue:
+    """Очередь задач транскрипции поверх таблицы audio_files.
+
+    Статусы строк: queued -> processing -> done / error, в поле
+    status_column (у фонового уточнения своё — refine_status). Порядок
+    выдачи задач воркерам и допуск новых определяет scheduler. Если передан
+    writer, смены статусов всех воркеров фиксируются пачками через него.
+    """
+
+    def __init__(self, handler: JobHandler, workers: int = 2,
+                 writer: Optional[GroupCommitWriter[Dict[str, Any]]] = None,
+                 scheduler: Optional[JobScheduler] = None, status_column: str = "status",
+                 on_done: Optional[JobDone] = None) -> None:
+        self.handler = handler
+        self.workers = workers
+        self.writer = writer
+        self.scheduler = scheduler or JobScheduler(max_jobs=1_000_000, max_backlog_seconds=float("inf"))
+        self.status_column = status_column
+        self.on_done = on_done
+        # Взведён с начала start(): строки, записанные раньше, подберёт восстановление из БД
+        self.started = False
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    @property
+    def depth(self) -> int:
+        return self.scheduler.depth
+
+    def submit(self, job_id: int, duration: Optional[float] = None, force: bool = False) -> None:
+        """Ставит задачу в очередь; без force может бросить SchedulerFull."""
+        self.scheduler.admit(job_id, duration, force)
+
+    async def start(self) -> None:
+        self.started = True
+        # Подхватываем задачи, оставшиеся после перезапуска, — вне лимитов очереди
+        async with async_session() as session:
+            pending = await audio_crud.get_pending_jobs(session, self.status_column)
+        for job_id, url in pending:
+            self.submit(job_id, await asyncio.to_thread(probe_duration, url), force=True)
+        if pending:
+            logger.info("Восстановлено задач из БД: %d", len(pending))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, duration = await self.scheduler.get()
+            started = time.perf_counter()
+            try:
+                await self._run(job_id, duration)
+                self.scheduler.record(duration, time.perf_counter() - started)
+            except Exception:
+                logger.exception("Сбой обработки задачи %d", job_id)
+            finally:
+                self.scheduler.task_done()
+
+    async def _set_status(self, job_id: int, status: str, fields: Optional[Dict[str, Any]] = None) -> None:
+        values: Dict[str, Any] = {"id": job_id, self.status_column: status, **(fields or {})}
+        if self.writer is None:
+            async with async_session() as session:
+                await audio_crud.apply_updates(session, [values])
+            return
+        await self.writer.write(values)
+
+    async def _run(self, job_id: int, duration: Optional[float] = None) -> None:
+        async with async_session() as session:
+            audio = await audio_crud.get_audio(session, job_id)
+            if audio is None:
+                return
+            url = audio.url
+        await self._set_status(job_id, "processing")
+
+        try:
+            result = await self.handler(url)
+        except Exception:
+            logger.exception("Ошибка транскрипции задачи %d", job_id)
+            await self._set_status(job_id, "error")
+            return
+
+        fields = {"transcription": result} if isinstance(result, str) else result
+        await self._set_status(job_id, "done", fields)
+        if self.on_done is not None:
+            self.on_done(job_id, duration, fields)
@@ -0,0 +1,122 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from litestar import WebSocket
+from vosk import KaldiRecognizer, Model
+
+from app.audio_frontend import AudioFrontend
+from app.mic_sessions import SegmentSink, SegmentStore
+from app.punctuation import IncrementalPunctuator
+
+logger = logging.getLogger(__name__)
+
+# Размер кадра, который клиент присылает по WebSocket, мс
+BLOCK_MS = 200
+
+PredictLabels = Callable[[str], Awaitable[List[str]]]
+
+
+async def run_live_socket(socket: WebSocket[Any, Any, Any], model: Model, predict_labels: PredictLabels,
+                          punctuator: IncrementalPunctuator, samplerate: int = 16000,
+                          block_ms: int = BLOCK_MS, sink: Optional[SegmentSink] = None) -> None:
+    """Живое распознавание по WebSocket.
+
+    Клиент шлёт бинарные кадры PCM int16 моно с частотой samplerate, сервер
+    отвечает JSON-сообщениями:
+      {"type": "partial", "text": ...} — текущая гипотеза, пока фраза не закончена;
+      {"type": "final", "text": ..., "raw": ...} — законченная фраза с пунктуацией;
+        поле "revised_previous", если есть, заменяет текст предыдущей фразы.
+    Текстовый кадр "stop" завершает сессию: остаток аудио дораспознаётся.
+    Финальные фразы с правками уходят в sink под session_id из "ready".
+    """
+    await socket.accept()
+    session_id = uuid.uuid4().hex
+    frontend = AudioFrontend(samplerate)
+    rec = KaldiRecognizer(model, frontend.out_rate)
+    await socket.send_json({"type": "ready", "session_id": session_id, "samplerate": samplerate, "block_ms": block_ms})
+    store = SegmentStore(on_change=functools.partial(sink, session_id) if sink is not None else None)
+
+    # Пунктуация финальных фраз идёт параллельно с приёмом аудио, но по порядку:
+    # каждая следующая фраза размечается с контекстом предыдущих
+    finals: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+    sender = asyncio.create_task(_send_finals(socket, finals, predict_labels, punctuator, store))
+    audio_bytes = 0
+    first_audio: Optional[float] = None
+    first_text_sent = False
+    last_partial = ""
+
+    def accept(data: bytes) -> bool:
+        pcm = frontend.process_bytes(data)
+        return bool(pcm) and rec.AcceptWaveform(pcm)
+
+    def emit_final(raw_result: str, received: float) -> None:
+        text = json.loads(raw_result).get("text", "")
+        if text:
+            finals.put_nowait({"raw": text, "received": received})
+
+    try:
+        while True:
+            message = await socket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") == "stop":
+                emit_final(await asyncio.to_thread(rec.FinalResult), time.perf_counter())
+                break
+            data = message.get("bytes")
+            if not isinstance(data, bytes) or not data:
+                continue
+            received = time.perf_counter()
+            if first_audio is None:
+                first_audio = received
+            audio_bytes += len(data)
+
+            if await asyncio.to_thread(accept, data):
+                emit_final(rec.Result(), received)
+                last_partial = ""
+                continue
+            partial = json.loads(rec.PartialResult()).get("partial", "")
+            if partial and partial != last_partial:
+                last_partial = partial
+                update: Dict[str, Any] = {"type": "partial", "text": partial, "audio_ms": audio_bytes * 500 // samplerate}
+                if not first_text_sent:
+                    # Задержка от первого кадра аудио до первого текста
+                    update["first_text_ms"] = round((time.perf_counter() - first_audio) * 1000)
+                    first_text_sent = True
+                await socket.send_json(update)
+    finally:
+        finals.put_nowait(None)
+        try:
+            await sender
+            await socket.close()
+        except Exception as e:
+            logger.info("WebSocket закрыт до отправки всех фраз: %s", e)
+
+
+async def _send_finals(socket: WebSocket[Any, Any, Any], finals: "asyncio.Queue[Optional[Dict[str, Any]]]",
+                       predict_labels: PredictLabels, punctuator: IncrementalPunctuator,
+                       store: SegmentStore) -> None:
+    while (item := await finals.get()) is not None:
+        raw = item["raw"]
+        try:
+            labels: Optional[List[str]] = await predict_labels(punctuator.request(raw))
+        except Exception as e:
+            logger.warning("Ошибка пунктуации: %s", e)
+            labels = None
+        text, revised = punctuator.commit(raw, labels)
+        if revised is not None:
+            store.replace_last(revised)
+        store.append(text)
+        message: Dict[str, Any] = {
+            "type": "final",
+            "text": text,
+            "raw": raw,
+            "latency_ms": round((time.perf_counter() - item["received"]) * 1000),
+        }
+        if revised is not None:
+            message["revised_previous"] = revised
+        await socket.send_json(message)
@@ -0,0 +1,241 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from litestar.enums import ScopeType
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+# Заголовок Server-Timing с разбивкой по этапам в каждом HTTP-ответе
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0") == "1"
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Metric):
+    """Значение, которое считывается функцией в момент выдачи /metrics."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]) -> None:
+        super().__init__(name, documentation)
+        self._read = read
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self._read())}"]
+
+
+class CallbackCounter(Gauge):
+    """Счётчик, который уже ведёт какой-то объект приложения."""
+
+    kind = "counter"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # На каждый набор меток: счётчики по корзинам (последняя — +Inf), сумма
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][idx] += 1
+            entry[1][0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        lines = []
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(total)}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> None:
+        self.register(Gauge(name, documentation, read))
+
+    def counter(self, name: str, documentation: str, read: Callable[[], float]) -> None:
+        self.register(CallbackCounter(name, documentation, read))
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+stage_seconds = Histogram("tt_stage_seconds", "Время этапов конвейера транскрипции", ("stage",))
+transcription_rtf = Histogram("tt_transcription_rtf", "Время распознавания файла, делённое на его длительность",
+                              buckets=RTF_BUCKETS)
+http_seconds = Histogram("tt_http_request_seconds", "Время до начала HTTP-ответа", ("method", "status"))
+vad_skipped_ratio = Histogram("tt_vad_skipped_ratio", "Доля тишины, не поданной в распознаватель, по файлам",
+                              buckets=RATIO_BUCKETS)
+vad_seconds = Counter("tt_vad_audio_seconds_total", "Аудио через детектор речи: всё и пропущенное", ("kind",))
+for _metric in (stage_seconds, transcription_rtf, http_seconds, vad_skipped_ratio, vad_seconds):
+    REGISTRY.register(_metric)
+
+# Сумма этапов текущего запроса для Server-Timing (None — вне HTTP-запроса)
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+# -------------------- ЗАМЕРЫ ЭТАПОВ --------------------
+def observe_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def observe_stages(timings: Dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+
+def observe_vad(stats: Dict[str, float]) -> None:
+    """Итог детектора речи по одному файлу: {"audio_seconds": ..., "skipped_seconds": ...}."""
+    total = stats.get("audio_seconds", 0.0)
+    if not total:
+        return
+    vad_skipped_ratio.observe(stats["skipped_seconds"] / total)
+    vad_seconds.inc(total, "total")
+    vad_seconds.inc(stats["skipped_seconds"], "skipped")
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0)
+
+
+async def timed_chunks(chunks: AsyncIterable[bytes], stage: str = "upload_receive") -> AsyncIterator[bytes]:
+    """Пропускает чанки насквозь и считает только время ожидания их из сети."""
+    iterator = chunks.__aiter__()
+    waited = 0.0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                waited += time.perf_counter() - t0
+            yield chunk
+    finally:
+        observe_stage(stage, waited)
+
+
+# -------------------- HTTP --------------------
+def _server_timing(stages: Dict[str, float], total: float) -> bytes:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("ascii")
+
+
+def metrics_middleware(app: ASGIApp) -> ASGIApp:
+    """Время каждого HTTP-запроса и, при METRICS_SERVER_TIMING=1, заголовок Server-Timing."""
+
+    async def middleware(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != ScopeType.HTTP:
+            await app(scope, receive, send)
+            return
+        stages: Dict[str, float] = {}
+        token = _request_stages.set(stages)
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - t0
+                http_seconds.observe(total, scope["method"], str(message["status"]))
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(stages, total)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await app(scope, receive, send_wrapper)
+        finally:
+            _request_stages.reset(token)
+
+    return middleware
@@ -0,0 +1,224 @@
+import bisect
+import functools
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import sounddevice as sd
+from vosk import KaldiRecognizer, Model
+
+from app import vad
+from app.audio_frontend import AudioFrontend
+from app.punctuation import IncrementalPunctuator
+from app.vad import VoiceGate
+
+logger = logging.getLogger(__name__)
+
+BLOCKSIZE = 16000
+# Сколько блоков аудио может ждать распознавания, прежде чем старые начнут вытесняться
+BUFFER_BLOCKS = 32
+MAX_SEGMENTS = 10000
+MAX_SESSIONS = 8
+
+# Получатель изменений фраз: (session_id, позиция, seq, текст); вызывается под замком хранилища
+SegmentSink = Callable[[str, int, int, str], None]
+
+
+class AudioRing:
+    """Ограниченный буфер блоков аудио: при переполнении вытесняются самые старые."""
+
+    def __init__(self, capacity: int) -> None:
+        self._blocks: Deque[bytes] = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def put(self, block: bytes) -> None:
+        with self._cond:
+            if len(self._blocks) == self._blocks.maxlen:
+                self.dropped += 1
+            self._blocks.append(block)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> Optional[bytes]:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._blocks, timeout):
+                return None
+            return self._blocks.popleft()
+
+
+class SegmentStore:
+    """Фразы сессии с курсором: каждая запись помечена номером изменения.
+
+    since(cursor) отдаёт только фразы, изменённые после cursor, поэтому опрос
+    не пересылает всю историю. Самые старые фразы сверх max_segments удаляются.
+    Каждое изменение передаётся в on_change(позиция, seq, текст) в порядке seq —
+    например, в фоновую запись в БД; он не должен блокировать.
+    """
+
+    def __init__(self, max_segments: int = MAX_SEGMENTS,
+                 on_change: Optional[Callable[[int, int, str], None]] = None) -> None:
+        self.max_segments = max_segments
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._texts: List[str] = []
+        self._seqs: List[int] = []
+        self._base = 0
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return self._base + len(self._texts)
+
+    @property
+    def cursor(self) -> int:
+        return self._seq
+
+    def append(self, text: str) -> int:
+        with self._lock:
+            self._seq += 1
+            self._texts.append(text)
+            self._seqs.append(self._seq)
+            if len(self._texts) > self.max_segments:
+                excess = len(self._texts) - self.max_segments
+                del self._texts[:excess]
+                del self._seqs[:excess]
+                self._base += excess
+            position = self._base + len(self._texts) - 1
+            if self._on_change is not None:
+                self._on_change(position, self._seq, text)
+            return position
+
+    def replace_last(self, text: str) -> None:
+        """Исправляет последнюю фразу; она снова попадёт в ответ since() с новым номером."""
+        with self._lock:
+            if not self._texts:
+                return
+            self._seq += 1
+            self._texts[-1] = text
+            self._seqs[-1] = self._seq
+            if self._on_change is not None:
+                self._on_change(self._base + len(self._texts) - 1, self._seq, text)
+
+    def since(self, cursor: int) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            pos = bisect.bisect_right(self._seqs, cursor)
+            items = [{"index": self._base + i, "text": self._texts[i]} for i in range(pos, len(self._texts))]
+            return items, self._seq
+
+
+class MicSession:
+    """Сессия микрофона: свой распознаватель, буфер аудио и хранилище фраз.
+
+    Если задан sink, каждое изменение фраз уходит и в него (в main — в
+    фоновую запись в live_segments).
+    """
+
+    def __init__(self, model: Model, samplerate: int, device: Optional[int],
+                 predict_labels: Callable[[str], List[str]], punctuator: IncrementalPunctuator,
+                 blocksize: int = BLOCKSIZE, buffer_blocks: int = BUFFER_BLOCKS,
+                 sink: Optional[SegmentSink] = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.samplerate = samplerate
+        self.device = device
+        self.blocksize = blocksize
+        # Устройство открывается на родной частоте, распознаватель получает частоту модели
+        self.frontend = AudioFrontend(samplerate)
+        self.recognizer = KaldiRecognizer(model, self.frontend.out_rate)
+        # Тишина в распознаватель не идёт, а долгая пауза сразу закрывает фразу
+        self.gate = VoiceGate(self.frontend.out_rate) if vad.ENABLED else None
+        self.audio = AudioRing(buffer_blocks)
+        self.results = SegmentStore(on_change=functools.partial(sink, self.id) if sink is not None else None)
+        self._predict_labels = predict_labels
+        self.punctuator = punctuator
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"mic-{self.id[:8]}", daemon=True)
+
+    @property
+    def active(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _on_audio(self, indata: Any, frames: int, time: Any, status: Any) -> None:
+        if status: print("⚠", status)
+        self.audio.put(bytes(indata))
+
+    def _run(self) -> None:
+        try:
+            with sd.RawInputStream(samplerate=self.samplerate, blocksize=self.blocksize, device=self.device,
+                                   dtype="int16", channels=1, callback=self._on_audio):
+                while not self._stop.is_set():
+                    data = self.audio.get(timeout=0.1)
+                    if data is None:
+                        continue
+                    pcm = self.frontend.process_bytes(data)
+                    if pcm:
+                        vad.feed(self.recognizer, self.gate, pcm, self._on_result)
+            # Придержанный гейтом звук и недоговорённая фраза — последние слова сессии
+            vad.flush(self.recognizer, self.gate, self._on_result)
+            self._on_result(self.recognizer.FinalResult())
+        except Exception:
+            logger.exception("Сессия микрофона %s завершилась с ошибкой", self.id)
+            self._stop.set()
+
+    def _on_result(self, raw: str) -> None:
+        result = json.loads(raw)
+        if result.get("text"):
+            self._add_segment(result["text"])
+
+    def _add_segment(self, raw_text: str) -> None:
+        try:
+            labels: Optional[List[str]] = self._predict_labels(self.punctuator.request(raw_text))
+        except Exception as e:
+            print(f"Ошибка пунктуации: {e}")
+            labels = None
+        restored, revised = self.punctuator.commit(raw_text, labels)
+        if revised is not None:
+            self.results.replace_last(revised)
+        self.results.append(restored)
+        print(f"🎤 [{self.id[:8]}] {restored}")
+
+
+class MicSessionRegistry:
+    """Реестр сессий; остановленные хранятся для чтения, пока не вытеснены новыми."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS) -> None:
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, MicSession] = {}
+        self._lock = threading.Lock()
+
+    def add(self, session: MicSession) -> None:
+        with self._lock:
+            if sum(s.active for s in self._sessions.values()) >= self.max_sessions:
+                raise RuntimeError("Достигнут лимит одновременных сессий микрофона")
+            # Освобождаем место за счёт самых старых остановленных сессий
+            for sid in [sid for sid, s in self._sessions.items() if not s.active]:
+                if len(self._sessions) < self.max_sessions:
+                    break
+                del self._sessions[sid]
+            self._sessions[session.id] = session
+
+    def get(self, session_id: Optional[str] = None) -> Optional[MicSession]:
+        with self._lock:
+            if session_id is None:
+                # Без id — последняя созданная сессия
+                return next(reversed(self._sessions.values()), None)
+            return self._sessions.get(session_id)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(s.active for s in self._sessions.values())
+
+    def stop_all(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.stop()
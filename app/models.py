@@ -1,6 +1,8 @@
+from datetime import datetime
 from typing import Optional
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Text, Integer
+from sqlalchemy import String, Text, Integer, Index, DateTime, Computed, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 
 class Base(DeclarativeBase):
@@ -14,3 +16,39 @@ class AudioFile(Base):
     url: Mapped[str] = mapped_column(String, nullable=False)  # ссылка на аудио
     status: Mapped[str] = mapped_column(String, default="queued")  # queued / processing / done / error
     transcription: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # результат транскрипции
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # sha256 декодированного PCM
+    model_version: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)  # отпечаток моделей Vosk + RUPunct
+    # Двухуровневый режим: transcription сначала черновик быстрой модели, после уточнения — текст большой;
+    # model_version всегда относится к тексту в transcription
+    draft_transcription: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # черновик быстрой модели
+    draft_model_version: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    refine_status: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # queued / processing / done / error
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Поисковый вектор считает сама БД при каждой записи транскрипции
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR, Computed("to_tsvector('russian', coalesce(transcription, ''))", persisted=True), nullable=True
+    )
+
+    __table_args__ = (
+        Index("ix_audio_files_content_hash_model_version", "content_hash", "model_version"),
+        Index("ix_audio_files_created_at_id", "created_at", "id"),
+        # /jobs?status=... листается по (created_at, id) внутри статуса; префикс status заменяет одиночный индекс
+        Index("ix_audio_files_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_audio_files_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+
+class LiveSegment(Base):
+    """Фраза живой сессии (серверный микрофон или WebSocket)."""
+
+    __tablename__ = "live_segments"
+
+    session_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)  # номер фразы в сессии
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)  # номер последнего изменения фразы (курсор опроса)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_live_segments_session_id_seq", "session_id", "seq"),
+    )
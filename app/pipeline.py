@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import soundfile as sf
+
+from app.asr import SEGMENT_OVERLAP_SECONDS, SEGMENT_WINDOW_SECONDS, VoskExecutor, decode_file, iter_decode
+from app.metrics import timed, transcription_rtf
+from app.punct_batcher import PunctuationBatcher
+from app.punctuation import SentenceSplitter
+from app.registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+# Событие stream(): ("progress" | "segment" | "sentence" | "done", данные)
+StreamEvent = Tuple[str, Dict[str, Any]]
+
+# Не чаще раза в столько секунд сообщать о прогрессе распознавания
+PROGRESS_INTERVAL = 1.0
+
+
+class Pipeline:
+    """Файл -> текст с пунктуацией: общий код веб-сервера, старого интерфейса и CLI.
+
+    Vosk работает в пуле процессов executor, если он задан, иначе в потоке
+    вызывающего. Пунктуация идёт через общий батчер: тексты файлов,
+    распознанных одновременно, уходят в модель одним батчем. Записи не
+    короче segment_min_seconds (0 — никогда) пул распознаёт по окнам.
+    vosk_path выбирает модель реестра (по умолчанию модель запросов); пул
+    executor должен быть запущен на ней же.
+    """
+
+    def __init__(self, registry: ModelRegistry, batcher: Optional[PunctuationBatcher] = None,
+                 executor: Optional[VoskExecutor] = None, segment_min_seconds: float = 0.0,
+                 window_s: float = SEGMENT_WINDOW_SECONDS, overlap_s: float = SEGMENT_OVERLAP_SECONDS,
+                 vosk_path: Optional[str] = None) -> None:
+        self.registry = registry
+        self.vosk_path = vosk_path
+        self.batcher = batcher or PunctuationBatcher(lambda: registry.classifier)
+        self.executor = executor
+        self.segment_min_seconds = segment_min_seconds
+        self.window_s = window_s
+        self.overlap_s = overlap_s
+
+    @property
+    def vosk_model(self) -> Any:
+        return self.registry.vosk(self.vosk_path)
+
+    # -------------------- ПУНКТУАЦИЯ --------------------
+    def restore_punctuation(self, raw_text: str) -> str:
+        """Текст с пунктуацией; при сбое модели — исходный текст."""
+        if not raw_text: return ""
+        try:
+            with timed("punctuation"):
+                return self.batcher.punctuate(raw_text)
+        except Exception as e:
+            logger.warning("Ошибка пунктуации: %s", e)
+            return raw_text
+
+    async def restore_punctuation_async(self, raw_text: str) -> str:
+        if not raw_text: return ""
+        try:
+            with timed("punctuation"):
+                return await self.batcher.punctuate_async(raw_text)
+        except Exception as e:
+            logger.warning("Ошибка пунктуации: %s", e)
+            return raw_text
+
+    # -------------------- РАСПОЗНАВАНИЕ --------------------
+    def transcribe_file(self, filepath: PathLike) -> str:
+        """Синхронно, в текущем потоке: распознавание и пунктуация."""
+        return self.restore_punctuation(decode_file(self.vosk_model, filepath))
+
+    async def decode(self, filepath: PathLike, duration: Optional[float] = None) -> str:
+        """Сырой текст без пунктуации; блокирующее распознавание уходит из event loop."""
+        if self.executor is None:
+            return await asyncio.to_thread(decode_file, self.vosk_model, filepath)
+        if duration is None:
+            duration = (await asyncio.to_thread(sf.info, str(filepath))).duration
+        if 0 < self.segment_min_seconds <= duration:
+            return await self.executor.decode_segmented(filepath, self.window_s, self.overlap_s)
+        return await self.executor.decode(filepath)
+
+    async def transcribe(self, filepath: PathLike) -> str:
+        """Распознавание и пунктуация файла с диска; RTF уходит в метрики."""
+        started = time.perf_counter()
+        duration = (await asyncio.to_thread(sf.info, str(filepath))).duration
+        text = await self.restore_punctuation_async(await self.decode(filepath, duration))
+        if duration > 0:
+            transcription_rtf.observe((time.perf_counter() - started) / duration)
+        return text
+
+    async def stream(self, filepath: PathLike, progress_interval: float = PROGRESS_INTERVAL) -> AsyncIterator[StreamEvent]:
+        """Распознаёт файл с диска, отдавая события по ходу работы.
+
+        "progress" — доля прочитанного звука, "segment" — закрытая фраза Vosk
+        без пунктуации, "sentence" — законченное предложение с пунктуацией,
+        последним "done" с полным текстом. Vosk работает в отдельном потоке
+        (пул процессов целый файл отдаёт только в конце); если потребитель
+        бросит генератор, распознавание остановится на следующем блоке.
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        steps: "asyncio.Queue[Any]" = asyncio.Queue()
+        stop = threading.Event()
+
+        def run() -> None:
+            decoder = iter_decode(self.vosk_model, filepath)
+            try:
+                for step in decoder:
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(steps.put_nowait, step)
+            except Exception as e:
+                loop.call_soon_threadsafe(steps.put_nowait, e)
+            finally:
+                decoder.close()
+                loop.call_soon_threadsafe(steps.put_nowait, None)
+
+        worker = loop.run_in_executor(None, run)
+        splitter = SentenceSplitter()
+        raw: List[str] = []
+        sentences: List[str] = []
+        position = duration = 0.0
+        reported = float("-inf")
+        finished = False
+        try:
+            while not finished:
+                # Пока шла пунктуация, могло прийти несколько блоков — разбираем их разом
+                batch = [await steps.get()]
+                while not steps.empty():
+                    batch.append(steps.get_nowait())
+                new: List[str] = []
+                for item in batch:
+                    if item is None:
+                        finished = True
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    position, duration, texts = item
+                    new += texts
+                for text in new:
+                    yield "segment", {"text": text}
+                raw += new
+                now = time.perf_counter()
+                if duration > 0 and (finished or now - reported >= progress_interval):
+                    reported = now
+                    yield "progress", {"percent": round(100 * position / duration, 1), "seconds": round(position, 1),
+                                       "duration": round(duration, 1)}
+                if new or finished:
+                    for sentence in await self._sentences(splitter, " ".join(new), finished):
+                        sentences.append(sentence)
+                        yield "sentence", {"text": sentence}
+        finally:
+            stop.set()
+        await worker
+        if duration > 0:
+            transcription_rtf.observe((time.perf_counter() - started) / duration)
+        yield "done", {"text": " ".join(sentences), "raw": " ".join(raw)}
+
+    async def _sentences(self, splitter: SentenceSplitter, raw_text: str, final: bool) -> List[str]:
+        labels: Optional[List[str]]
+        try:
+            with timed("punctuation"):
+                labels = await self.batcher.predict_labels_async(splitter.request(raw_text))
+        except Exception as e:
+            logger.warning("Ошибка пунктуации: %s", e)
+            labels = None
+        return splitter.commit(raw_text, labels, final)
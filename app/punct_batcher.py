@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from app import punctuation
+from app.punctuation import PunctuationPlan
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать попутчиков для батча, секунд
+MAX_DELAY = 0.02
+
+# (текст, future, вернуть метки слов вместо текста)
+_Request = Tuple[str, "Future[Any]", bool]
+_Planned = Tuple[PunctuationPlan, "Future[Any]", bool]
+
+
+class PunctuationBatcher:
+    """Общий батчер пунктуации для всех источников: загрузок, микрофона, WebSocket.
+
+    Запросы копятся в очереди и уходят в модель одним проходом, как только
+    набралось max_batch окон или истёк max_delay с момента первого запроса.
+    Модель вызывается только из потока батчера и запрашивается у
+    classifier_provider при первом батче. Поток стартует при первом запросе
+    в текущем процессе, поэтому батчер переживает fork.
+    """
+
+    def __init__(self, classifier_provider: Callable[[], Any], max_batch: int = punctuation.BATCH_SIZE, max_delay: float = MAX_DELAY,
+                 max_tokens: int = punctuation.MAX_TOKENS, context_words: int = punctuation.CONTEXT_WORDS) -> None:
+        self._classifier_provider = classifier_provider
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_tokens = max_tokens
+        self.context_words = context_words
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = 0
+        self._start_lock = threading.Lock()
+
+    @property
+    def classifier(self) -> Any:
+        return self._classifier_provider()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid != os.getpid() or self._thread is None:
+                # После fork потока батчера в дочернем процессе нет — заводим свой
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="punct-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, text: str, labels: bool = False) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        if not text.split():
+            future.set_result([] if labels else "")
+        else:
+            self._ensure_started()
+            self._queue.put((text, future, labels))
+        return future
+
+    def punctuate(self, text: str) -> str:
+        result: str = self.submit(text).result()
+        return result
+
+    async def punctuate_async(self, text: str) -> str:
+        result: str = await asyncio.wrap_future(self.submit(text))
+        return result
+
+    def predict_labels(self, text: str) -> List[str]:
+        labels: List[str] = self.submit(text, labels=True).result()
+        return labels
+
+    async def predict_labels_async(self, text: str) -> List[str]:
+        return await asyncio.wrap_future(self.submit(text, labels=True))
+
+    def stop(self) -> None:
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _plan(self, request: _Request) -> Optional[_Planned]:
+        text, future, labels = request
+        if not future.set_running_or_notify_cancel():
+            return None
+        try:
+            plan = punctuation.plan_chunks(self.classifier.tokenizer, text, self.max_tokens, self.context_words)
+            return plan, future, labels
+        except Exception as e:
+            future.set_exception(e)
+            return None
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch: List[_Planned] = []
+            windows = 0
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                planned = self._plan(request)
+                if planned is not None:
+                    batch.append(planned)
+                    windows += len(planned[0].windows)
+                timeout = deadline - time.monotonic()
+                if windows >= self.max_batch or timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[_Planned]) -> None:
+        texts = [text for plan, _, _ in batch for text in plan.texts()]
+        try:
+            predictions = self.classifier(texts, batch_size=self.max_batch)
+        except Exception as e:
+            logger.exception("Сбой батча пунктуации")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        offset = 0
+        for plan, future, labels in batch:
+            count = len(plan.windows)
+            preds = predictions[offset:offset + count]
+            try:
+                future.set_result(punctuation.plan_labels(plan, preds) if labels else punctuation.assemble(plan, preds))
+            except Exception as e:
+                future.set_exception(e)
+            offset += count
@@ -0,0 +1,287 @@
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import torch
+from transformers import AutoModelForTokenClassification, AutoTokenizer, pipeline
+
+logger = logging.getLogger(__name__)
+
+# Окно модели в токенах и перекрытие соседних окон в словах
+MAX_TOKENS = 256
+CONTEXT_WORDS = 16
+BATCH_SIZE = 8
+
+# Живой поток: сколько уже выданных слов подавать модели как левый контекст
+# и сколько последних слов предыдущей фразы разрешено переразметить
+LIVE_CONTEXT_WORDS = 32
+LIVE_REVISE_WORDS = 3
+
+CASES = ("UPPER_TOTAL", "UPPER", "LOWER")
+
+# fp32 — исходные веса, int8 — динамическая квантизация Linear-слоёв при загрузке
+BACKENDS = ("fp32", "int8")
+
+Prediction = List[Dict[str, Any]]
+
+
+def configure_threads(num_threads: Optional[int] = None, interop_threads: Optional[int] = None) -> None:
+    """Настраивает потоки torch; вызывать до первого инференса."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Пул inter-op потоков уже создан — менять поздно
+            logger.warning("Не удалось задать inter-op потоки: torch уже запущен")
+
+
+def load_classifier(model_path: str, backend: str = "fp32") -> Any:
+    """Загружает RUPunct в виде NER-пайплайна на CPU с выбранным бэкендом."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд пунктуации {backend!r}, ожидался один из {BACKENDS}")
+    tk = AutoTokenizer.from_pretrained(model_path, strip_accents=False, add_prefix_space=True)
+    model = AutoModelForTokenClassification.from_pretrained(model_path)
+    model.eval()
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("ner", model=model, tokenizer=tk, aggregation_strategy="first", device=-1)
+
+
+# Знак после слова по метке RUPunct (вторая часть метки, после регистра)
+PUNCT_SUFFIXES = {
+    "O": "", "PERIOD": ".", "COMMA": ",", "QUESTION": "?", "TIRE": " —", "DVOETOCHIE": ":",
+    "VOSKL": "!", "PERIODCOMMA": ";", "DEFIS": "-", "MNOGOTOCHIE": "...", "QUESTIONVOSKL": "?!",
+}
+_CASE_FUNCS: Dict[str, Callable[[str], str]] = {"LOWER": lambda token: token, "UPPER": str.capitalize, "UPPER_TOTAL": str.upper}
+
+# Полная таблица меток: регистр слова и знак после него; строится один раз
+LABELS = {
+    f"{case}_{punct}": (_CASE_FUNCS[case], suffix)
+    for case in CASES
+    for punct, suffix in PUNCT_SUFFIXES.items()
+}
+# Тире после строчного слова исторически пишется без пробела
+LABELS["LOWER_TIRE"] = (_CASE_FUNCS["LOWER"], "—")
+
+
+def process_token(token: str, label: str) -> str:
+    entry = LABELS.get(label)
+    if entry is None:
+        return token
+    case, suffix = entry
+    return case(token) + suffix
+
+
+@dataclass
+class PunctuationPlan:
+    """Разбиение текста на окна модели: слова и диапазоны слов каждого окна."""
+    words: List[str]
+    windows: List[Tuple[int, int]] = field(default_factory=list)
+
+    def texts(self) -> List[str]:
+        return [" ".join(self.words[start:stop]) for start, stop in self.windows]
+
+
+def plan_chunks(tokenizer: Any, text: str, max_tokens: int = MAX_TOKENS,
+                context_words: int = CONTEXT_WORDS) -> PunctuationPlan:
+    """Набирает окна по фактическому числу токенов, соседние окна перекрываются на context_words слов."""
+    words = text.split()
+    plan = PunctuationPlan(words)
+    if not words:
+        return plan
+    # Спецтокены (<s>, </s>) тоже занимают место в окне
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    lengths = [len(ids) for ids in tokenizer(words, add_special_tokens=False)["input_ids"]]
+    start = 0
+    while True:
+        stop, used = start, 0
+        while stop < len(words) and (stop == start or used + lengths[stop] <= budget):
+            used += lengths[stop]
+            stop += 1
+        plan.windows.append((start, stop))
+        if stop >= len(words):
+            return plan
+        start = stop - context_words if stop - context_words > start else stop
+
+
+def split_label(label: str) -> Tuple[str, str]:
+    for case in CASES:
+        if label.startswith(case + "_"):
+            return case, label[len(case) + 1:]
+    return "LOWER", label
+
+
+def word_labels(words: Sequence[str], preds: Prediction) -> List[str]:
+    """Переводит группы сущностей пайплайна в метку на каждое слово.
+
+    Пайплайн склеивает соседние слова с одинаковой меткой в одну группу:
+    регистр применяется к группе целиком, знак ставится после последнего слова.
+    """
+    starts = []
+    offset = 0
+    for word in words:
+        starts.append(offset)
+        offset += len(word) + 1
+    labels = ["LOWER_O"] * len(words)
+    idx = 0
+    for group in preds:
+        members = []
+        while idx < len(words) and starts[idx] < group["end"]:
+            if starts[idx] >= group["start"]:
+                members.append(idx)
+            idx += 1
+        if not members:
+            continue
+        case, punct = split_label(group["entity_group"])
+        rest = "LOWER" if case == "UPPER" else case
+        for n, i in enumerate(members):
+            word_case = case if n == 0 else rest
+            labels[i] = f"{word_case}_{punct if n == len(members) - 1 else 'O'}"
+    return labels
+
+
+def merge_labels(plan: PunctuationPlan, per_window: List[List[str]]) -> List[str]:
+    """Собирает метки слов из окон; в перекрытии каждое окно отвечает за свою половину."""
+    labels = ["LOWER_O"] * len(plan.words)
+    for i, (start, stop) in enumerate(plan.windows):
+        lo = start if i == 0 else (start + plan.windows[i - 1][1]) // 2
+        hi = stop if i == len(plan.windows) - 1 else (plan.windows[i + 1][0] + stop) // 2
+        labels[lo:hi] = per_window[i][lo - start:hi - start]
+    return labels
+
+
+def render(words: Sequence[str], labels: Sequence[str]) -> str:
+    return " ".join(process_token(word, label) for word, label in zip(words, labels))
+
+
+def assemble(plan: PunctuationPlan, predictions: List[Prediction]) -> str:
+    return render(plan.words, plan_labels(plan, predictions))
+
+
+def plan_labels(plan: PunctuationPlan, predictions: List[Prediction]) -> List[str]:
+    per_window = [
+        word_labels(plan.words[start:stop], preds)
+        for (start, stop), preds in zip(plan.windows, predictions)
+    ]
+    return merge_labels(plan, per_window)
+
+
+def predict_labels(classifier: Any, raw_text: str, batch_size: int = BATCH_SIZE,
+                   max_tokens: int = MAX_TOKENS, context_words: int = CONTEXT_WORDS) -> List[str]:
+    """Метка на каждое слово текста — для сравнения бэкендов между собой."""
+    plan = plan_chunks(classifier.tokenizer, raw_text, max_tokens, context_words)
+    if not plan.windows:
+        return []
+    return plan_labels(plan, classifier(plan.texts(), batch_size=batch_size))
+
+
+def restore_punctuation(classifier: Any, raw_text: str, batch_size: int = BATCH_SIZE,
+                        max_tokens: int = MAX_TOKENS, context_words: int = CONTEXT_WORDS) -> str:
+    """Расставляет пунктуацию, прогоняя все окна текста через модель батчами."""
+    plan = plan_chunks(classifier.tokenizer, raw_text, max_tokens, context_words)
+    if not plan.windows:
+        return ""
+    predictions = classifier(plan.texts(), batch_size=batch_size)
+    return assemble(plan, predictions)
+
+
+class IncrementalPunctuator:
+    """Пунктуация живого потока фраз за постоянное время на фразу.
+
+    Модель размечает только новую фразу, но видит перед ней до context_words
+    уже выданных слов: так верно ставятся заглавные буквы и знаки на стыках.
+    Если с новым контекстом поменялись метки последних revise_words слов
+    предыдущей фразы, commit() возвращает её исправленный вариант.
+
+        text, revised = punctuator.commit(raw, predict(punctuator.request(raw)))
+    """
+
+    def __init__(self, context_words: int = LIVE_CONTEXT_WORDS, revise_words: int = LIVE_REVISE_WORDS) -> None:
+        self.revise_words = revise_words
+        self._context: Deque[str] = deque(maxlen=context_words)
+        self._last_words: List[str] = []
+        self._last_labels: List[str] = []
+
+    def request(self, raw_text: str) -> str:
+        """Текст для модели: левый контекст плюс новая фраза."""
+        return " ".join([*self._context, *raw_text.split()])
+
+    def commit(self, raw_text: str, labels: Optional[Sequence[str]]) -> Tuple[str, Optional[str]]:
+        """Принимает метки для request(raw_text); возвращает (новая фраза, исправленная предыдущая или None)."""
+        words = raw_text.split()
+        context_len = len(self._context)
+        if labels is None or len(labels) != context_len + len(words):
+            # Модель недоступна — выдаём фразу без разметки, контекст всё равно копим
+            labels = ["LOWER_O"] * (context_len + len(words))
+        context_labels, new_labels = list(labels[:context_len]), list(labels[context_len:])
+
+        revised = None
+        k = min(self.revise_words, len(self._last_words), context_len)
+        if k:
+            updated = self._last_labels[:-k] + context_labels[-k:]
+            if updated != self._last_labels:
+                self._last_labels = updated
+                revised = render(self._last_words, updated)
+
+        self._context.extend(words)
+        self._last_words, self._last_labels = words, new_labels
+        return render(words, new_labels), revised
+
+
+# Метки, после которых предложение закончено
+SENTENCE_END_PUNCT = ("PERIOD", "QUESTION", "VOSKL", "MNOGOTOCHIE", "QUESTIONVOSKL")
+# Хвост без конца предложения длиннее этого выдаётся как есть, чтобы не копить его бесконечно
+SENTENCE_MAX_WORDS = 120
+
+
+def is_sentence_end(label: str) -> bool:
+    return label.rsplit("_", 1)[-1] in SENTENCE_END_PUNCT
+
+
+class SentenceSplitter:
+    """Выдаёт из потока фраз Vosk законченные предложения с пунктуацией.
+
+    Незаконченный хвост (слова после последнего конца предложения) ждёт
+    следующей фразы и размечается заново вместе с ней: знак в конце входа
+    модель ставит почти всегда, верить ему можно, только когда за ним есть
+    продолжение. Перед хвостом модель видит context_words уже выданных слов.
+
+        sentences = splitter.commit(raw, predict(splitter.request(raw)))
+    """
+
+    def __init__(self, context_words: int = LIVE_CONTEXT_WORDS, max_words: int = SENTENCE_MAX_WORDS) -> None:
+        self.max_words = max_words
+        self._context: Deque[str] = deque(maxlen=context_words)
+        self._pending: List[str] = []
+
+    def request(self, raw_text: str) -> str:
+        """Текст для модели: левый контекст, хвост и новая фраза."""
+        return " ".join([*self._context, *self._pending, *raw_text.split()])
+
+    def commit(self, raw_text: str, labels: Optional[Sequence[str]], final: bool = False) -> List[str]:
+        """Принимает метки для request(raw_text); возвращает законченные предложения.
+
+        final=True — фраз больше не будет, хвост выдаётся последним предложением.
+        """
+        words = self._pending + raw_text.split()
+        context_len = len(self._context)
+        if labels is None or len(labels) != context_len + len(words):
+            # Модель недоступна — слова уходят без разметки, чтобы не копиться
+            labels = ["LOWER_O"] * (context_len + len(words))
+            final = True
+        labels = list(labels[context_len:])
+
+        ends = [i + 1 for i, label in enumerate(labels[:-1]) if is_sentence_end(label)]
+        if final or len(words) > self.max_words:
+            ends.append(len(words))
+        sentences = []
+        start = 0
+        for stop in ends:
+            sentences.append(render(words[start:stop], labels[start:stop]))
+            start = stop
+        self._context.extend(words[:start])
+        self._pending = words[start:]
+        return [s for s in sentences if s]
@@ -0,0 +1,176 @@
+import asyncio
+import gc
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from vosk import KaldiRecognizer, Model
+
+from app import punctuation, vad
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-ru-0.22")
+PUNCT_MODEL_PATH = os.getenv("PUNCT_MODEL_PATH", "models/RUPunct_big")
+# Модель Vosk для уточнения черновиков в фоне; пусто — без второго прохода
+REFINE_MODEL_PATH = os.getenv("VOSK_REFINE_MODEL_PATH", "")
+
+
+class ModelRegistry:
+    """Модели процесса: грузятся один раз, лениво, при первом обращении.
+
+    preload() загружает и прогревает всё заранее. Если вызвать его в
+    родительском процессе до fork, воркеры получат веса copy-on-write и не
+    будут загружать свои копии.
+
+    vosk_path — модель запросов (черновиков), refine_path — модель
+    фонового уточнения, если он включён. Её грузят процессы пула уточнения,
+    в основной процесс она попадает только при прямом обращении.
+    """
+
+    def __init__(self, vosk_path: str = MODEL_PATH, punct_path: str = PUNCT_MODEL_PATH,
+                 punct_backend: str = "fp32", punct_threads: int = 0, punct_interop_threads: int = 0,
+                 refine_path: Optional[str] = None) -> None:
+        self.vosk_path = vosk_path
+        self.refine_path = refine_path or None
+        self.punct_path = punct_path
+        self.punct_backend = punct_backend
+        self.punct_threads = punct_threads
+        self.punct_interop_threads = punct_interop_threads
+        self._vosk: Dict[str, Model] = {}
+        self._classifier: Optional[Any] = None
+        # У каждой модели свой замок: долгая загрузка RUPunct не держит загрузку Vosk
+        self._vosk_lock = threading.Lock()
+        self._classifier_lock = threading.Lock()
+        self.state = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._versions: Dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def loaded_models(self) -> List[str]:
+        names = list(self._vosk)
+        if self._classifier is not None:
+            names.append(f"{self.punct_path} ({self.punct_backend})")
+        return names
+
+    @property
+    def model_version(self) -> str:
+        """Отпечаток моделей запросов: по нему кэшируются черновики."""
+        return self.version_of(self.vosk_path)
+
+    @property
+    def refine_version(self) -> Optional[str]:
+        return self.version_of(self.refine_path) if self.refine_path else None
+
+    @property
+    def final_version(self) -> str:
+        """Отпечаток моделей, которые дают окончательный текст: с уточнением — его."""
+        return self.refine_version or self.model_version
+
+    def version_of(self, vosk_path: str) -> str:
+        """Отпечаток Vosk vosk_path вместе с пунктуацией: пути, бэкенд пунктуации,
+        настройки детектора речи, размеры и mtime файлов."""
+        version = self._versions.get(vosk_path)
+        if version is None:
+            digest = hashlib.sha1(self.punct_backend.encode())
+            digest.update(vad.fingerprint().encode())
+            for path in (vosk_path, self.punct_path):
+                root = Path(path)
+                digest.update(str(root).encode())
+                for file in sorted(root.rglob("*")) if root.is_dir() else []:
+                    if file.is_file():
+                        st = file.stat()
+                        digest.update(f"{file.relative_to(root)}:{st.st_size}:{st.st_mtime_ns}".encode())
+            version = self._versions[vosk_path] = digest.hexdigest()[:16]
+        return version
+
+    def loaded_vosk(self, path: str) -> Optional[Model]:
+        """Уже загруженная модель или None; без замка — безопасно звать в процессе после fork."""
+        return self._vosk.get(path)
+
+    def vosk(self, path: Optional[str] = None) -> Model:
+        path = path or self.vosk_path
+        model = self._vosk.get(path)
+        if model is None:
+            with self._vosk_lock:
+                model = self._vosk.get(path)
+                if model is None:
+                    print(f"🔄 Загрузка модели Vosk {path}...")
+                    model = self._vosk[path] = Model(path)
+        return model
+
+    @property
+    def vosk_model(self) -> Model:
+        return self.vosk()
+
+    @property
+    def classifier(self) -> Any:
+        if self._classifier is None:
+            with self._classifier_lock:
+                if self._classifier is None:
+                    print(f"🔄 Загрузка модели пунктуации {self.punct_path} ({self.punct_backend})...")
+                    punctuation.configure_threads(self.punct_threads, self.punct_interop_threads)
+                    self._classifier = punctuation.load_classifier(self.punct_path, self.punct_backend)
+        return self._classifier
+
+    def warmup(self) -> None:
+        """Прогоняет пустой звук и короткую фразу, чтобы первый запрос не платил за инициализацию."""
+        rec = KaldiRecognizer(self.vosk_model, 16000)
+        rec.AcceptWaveform(bytes(32000))
+        rec.FinalResult()
+        punctuation.restore_punctuation(self.classifier, "проверка связи")
+
+    def load(self) -> None:
+        if self.ready:
+            return
+        self.state = "loading"
+        t0 = time.perf_counter()
+        try:
+            self.warmup()
+        except Exception as e:
+            self.state = "error"
+            self.error = str(e)
+            print(f"❌ Ошибка загрузки моделей: {e}")
+            raise
+        self.load_seconds = time.perf_counter() - t0
+        self.state = "ready"
+        print(f"✅ Модели загружены за {self.load_seconds:.1f} с")
+
+    async def load_async(self) -> None:
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception:
+            logger.exception("Модели не загружены")
+
+    def preload(self) -> None:
+        """Загрузка до fork: после неё объекты переводятся в постоянное поколение GC,
+        чтобы сборщик мусора не трогал их страницы в дочерних процессах."""
+        self.load()
+        gc.freeze()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "version": self._versions.get(self.vosk_path),
+            "refine_version": self._versions.get(self.refine_path) if self.refine_path else None,
+            "loaded": self.loaded_models,
+        }
+
+
+registry = ModelRegistry(
+    punct_backend=os.getenv("PUNCT_BACKEND", "fp32"),
+    punct_threads=int(os.getenv("PUNCT_THREADS", "0")),
+    punct_interop_threads=int(os.getenv("PUNCT_INTEROP_THREADS", "0")),
+    refine_path=REFINE_MODEL_PATH,
+)
@@ -0,0 +1,104 @@
+import asyncio
+import itertools
+import math
+import time
+from typing import Optional, Tuple
+
+import soundfile as sf
+
+from app.ingest import is_remote
+
+# Сколько секунд аудио «прощается» задаче за каждую секунду ожидания:
+# при 10 часовая запись обгонит свежую короткую примерно через 6 минут
+AGING = 10.0
+# Стоимость задачи, длительность которой заранее неизвестна (скачивание по URL)
+UNKNOWN_DURATION = 600.0
+# Оценка времени распознавания к длительности до первых измерений
+INITIAL_RTF = 0.3
+RTF_SMOOTHING = 0.1
+
+
+def probe_duration(url: str) -> Optional[float]:
+    """Длительность из заголовка файла, без декодирования; None — если неизвестна."""
+    if is_remote(url):
+        return None
+    try:
+        return float(sf.info(url).duration)
+    except Exception:
+        return None
+
+
+class SchedulerFull(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Очередь переполнена, повторите через {retry_after} с")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """Очередь задач «сначала короткие» со старением и ограниченной ёмкостью.
+
+    Приоритет задачи — её длительность минус AGING * время ожидания. Раз
+    ожидание растёт у всех одинаково, порядок задаётся неизменным ключом
+    duration + AGING * время постановки, и хватает обычной кучи.
+
+    Ёмкость ограничена числом задач и суммарной длительностью аудио в
+    очереди. Если новая задача не помещается, admit() бросает SchedulerFull
+    с оценкой, через сколько секунд очередь разгрузится.
+    """
+
+    def __init__(self, max_jobs: int, max_backlog_seconds: float, parallelism: int = 1,
+                 aging: float = AGING) -> None:
+        self.max_jobs = max_jobs
+        self.max_backlog_seconds = max_backlog_seconds
+        self.parallelism = max(1, parallelism)
+        self.aging = aging
+        self.rtf = INITIAL_RTF
+        self.backlog_seconds = 0.0
+        self.rejected = 0
+        self._queue: "asyncio.PriorityQueue[Tuple[float, int, int, Optional[float]]]" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def free_slots(self) -> int:
+        return max(0, self.max_jobs - self.depth)
+
+    def retry_after(self, extra_seconds: float = 0.0) -> int:
+        """Сколько ждать, пока очередь освободится при текущей скорости распознавания."""
+        drain = (self.backlog_seconds + extra_seconds) * self.rtf / self.parallelism
+        return max(1, min(3600, math.ceil(drain)))
+
+    def check(self, duration: Optional[float] = None, jobs: int = 1) -> None:
+        """Бросает SchedulerFull, если jobs задач (и duration секунд аудио) не поместятся."""
+        if self.depth + jobs > self.max_jobs:
+            self.rejected += jobs
+            raise SchedulerFull(self.retry_after())
+        # Одна задача длиннее лимита всё же принимается в пустую очередь
+        if duration and self.depth and self.backlog_seconds + duration > self.max_backlog_seconds:
+            self.rejected += jobs
+            raise SchedulerFull(self.retry_after(duration))
+
+    def admit(self, job_id: int, duration: Optional[float] = None, force: bool = False) -> None:
+        if not force:
+            self.check(duration)
+        cost = duration if duration is not None else UNKNOWN_DURATION
+        if duration:
+            self.backlog_seconds += duration
+        self._queue.put_nowait((cost + self.aging * time.monotonic(), next(self._seq), job_id, duration))
+
+    async def get(self) -> Tuple[int, Optional[float]]:
+        _, _, job_id, duration = await self._queue.get()
+        if duration:
+            self.backlog_seconds = max(0.0, self.backlog_seconds - duration)
+        return job_id, duration
+
+    def task_done(self) -> None:
+        self._queue.task_done()
+
+    def record(self, duration: Optional[float], elapsed: float) -> None:
+        """Обновляет оценку RTF по завершённой задаче."""
+        if duration:
+            self.rtf += RTF_SMOOTHING * (elapsed / duration - self.rtf)
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 import msgspec
 
 class AudioFileSchema(msgspec.Struct):
@@ -5,3 +7,37 @@ class AudioFileSchema(msgspec.Struct):
     url: str
     status: str = "queued"
     transcription: str | None = None
+    created_at: datetime | None = None
+    draft_transcription: str | None = None
+    refine_status: str | None = None
+
+
+class AudioFileSummary(msgspec.Struct):
+    """Строка списков и поиска: без полного текста, он отдаётся только в /jobs/{id}."""
+    id: int
+    url: str
+    status: str
+    created_at: datetime | None = None
+    refine_status: str | None = None
+    snippet: str | None = None  # фрагменты с совпадениями (только в поиске)
+
+
+class AudioFilePage(msgspec.Struct):
+    items: list[AudioFileSummary]
+    next_cursor: str | None = None
+
+
+class BatchSubmitSchema(msgspec.Struct):
+    urls: list[str]
+
+
+class LiveSegmentSchema(msgspec.Struct):
+    index: int
+    seq: int
+    text: str
+
+
+class LiveSegmentPage(msgspec.Struct):
+    session_id: str
+    segments: list[LiveSegmentSchema]
+    next: int
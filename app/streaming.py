@@ -0,0 +1,180 @@
+from typing import AsyncIterator, Dict, Optional
+
+
+class MultipartFile:
+    """Потоковое чтение файла из multipart/form-data без загрузки тела в память.
+
+    В буфере одновременно держится не больше одного сетевого чанка и хвоста
+    длиной с разделитель.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], boundary: str, field: str = "file") -> None:
+        self._stream = stream
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        self._field = field
+        # Первой границе не предшествует CRLF — добавляем его, чтобы искать один шаблон
+        self._buf = b"\r\n"
+        self._eof = False
+        self.filename = ""
+        self.content_type = ""
+
+    async def _read_more(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    async def _read_until(self, marker: bytes) -> int:
+        while (idx := self._buf.find(marker)) < 0:
+            if not await self._read_more():
+                raise ValueError("Неожиданный конец multipart-тела")
+        return idx
+
+    async def _skip_part_body(self) -> None:
+        keep = len(self._delimiter) - 1
+        while self._buf.find(self._delimiter) < 0:
+            self._buf = self._buf[-keep:]
+            if not await self._read_more():
+                raise ValueError("Неожиданный конец multipart-тела")
+
+    async def open(self) -> None:
+        """Пропускает части формы до первого файла в поле field и читает его заголовки."""
+        while True:
+            idx = await self._read_until(self._delimiter)
+            self._buf = self._buf[idx + len(self._delimiter):]
+            while len(self._buf) < 2:
+                if not await self._read_more():
+                    raise ValueError("Неожиданный конец multipart-тела")
+            if self._buf.startswith(b"--"):
+                raise ValueError(f"В форме нет поля {self._field!r}")
+            end = await self._read_until(b"\r\n\r\n")
+            headers = _parse_headers(self._buf[2:end])
+            self._buf = self._buf[end + 4:]
+            disposition = _parse_disposition(headers.get("content-disposition", ""))
+            if disposition.get("name") == self._field and "filename" in disposition:
+                self.filename = _basename(disposition["filename"])
+                self.content_type = headers.get("content-type", "application/octet-stream")
+                return
+            await self._skip_part_body()
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Отдаёт содержимое файла по мере поступления."""
+        keep = len(self._delimiter) - 1
+        while True:
+            idx = self._buf.find(self._delimiter)
+            if idx >= 0:
+                if idx:
+                    yield self._buf[:idx]
+                self._buf = self._buf[idx:]
+                return
+            if len(self._buf) > keep:
+                data, self._buf = self._buf[:-keep], self._buf[-keep:]
+                yield data
+            if not await self._read_more():
+                raise ValueError("Неожиданный конец multipart-тела")
+
+
+def _basename(filename: str) -> str:
+    # Браузеры иногда присылают полный путь — оставляем только имя
+    return filename.replace("\\", "/").rsplit("/", 1)[-1]
+
+
+def _parse_headers(raw: bytes) -> Dict[str, str]:
+    headers = {}
+    for line in raw.decode("utf-8", "replace").split("\r\n"):
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def _parse_disposition(value: str) -> Dict[str, str]:
+    params = {}
+    for item in value.split(";")[1:]:
+        key, sep, val = item.strip().partition("=")
+        if sep:
+            params[key.lower()] = val.strip().strip('"')
+    return params
+
+
+class WavStreamParser:
+    """Инкрементальный разбор WAV: после заголовка отдаёт PCM по мере поступления байтов."""
+
+    def __init__(self) -> None:
+        self._buf = b""
+        self._riff_checked = False
+        self._skip = 0
+        self._tail = b""
+        # Сколько байтов чанка data ещё впереди; None — длина не записана (потоковая запись)
+        self._remaining: Optional[int] = None
+        self.header_done = False
+        self.audio_format: Optional[int] = None
+        self.channels = 0
+        self.samplerate = 0
+        self.bits = 0
+
+    @property
+    def is_pcm16(self) -> bool:
+        return self.audio_format in (1, 0xFFFE) and self.bits == 16 and self.channels > 0
+
+    @property
+    def block_align(self) -> int:
+        return max(self.channels * self.bits // 8, 1)
+
+    def feed(self, data: bytes) -> bytes:
+        """Принимает очередные байты файла, возвращает готовый к распознаванию PCM (возможно пустой)."""
+        if self.header_done:
+            return self._aligned(data)
+        self._buf += data
+        if not self._riff_checked:
+            if len(self._buf) < 12:
+                return b""
+            if self._buf[:4] != b"RIFF" or self._buf[8:12] != b"WAVE":
+                raise ValueError("Не RIFF/WAVE")
+            self._buf = self._buf[12:]
+            self._riff_checked = True
+        while True:
+            if self._skip:
+                n = min(self._skip, len(self._buf))
+                self._buf = self._buf[n:]
+                self._skip -= n
+                if self._skip:
+                    return b""
+            if len(self._buf) < 8:
+                return b""
+            chunk_id = self._buf[:4]
+            size = int.from_bytes(self._buf[4:8], "little")
+            if chunk_id == b"data":
+                if self.audio_format is None:
+                    raise ValueError("Чанк data раньше fmt")
+                self.header_done = True
+                # Кодировщики, пишущие без перемотки, оставляют 0 или 0xFFFFFFFF
+                self._remaining = size if 0 < size < 0xFFFFFFFF else None
+                pcm, self._buf = self._buf[8:], b""
+                return self._aligned(pcm)
+            if chunk_id == b"fmt ":
+                if len(self._buf) < 8 + size:
+                    return b""
+                fmt = self._buf[8:8 + size]
+                self.audio_format = int.from_bytes(fmt[0:2], "little")
+                self.channels = int.from_bytes(fmt[2:4], "little")
+                self.samplerate = int.from_bytes(fmt[4:8], "little")
+                self.bits = int.from_bytes(fmt[14:16], "little")
+            self._buf = self._buf[8:]
+            self._skip = size + (size & 1)
+
+    def _aligned(self, data: bytes) -> bytes:
+        # Чанки после data (LIST, id3, cue) не звук: отбрасываем всё за его концом
+        if self._remaining is not None:
+            data = data[:self._remaining]
+            self._remaining -= len(data)
+        # Отдаём только целые сэмплы, остаток ждёт следующего чанка
+        data = self._tail + data
+        cut = len(data) - len(data) % self.block_align
+        self._tail = data[cut:]
+        return data[:cut]
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Optional, Union
+
+import soundfile as sf
+
+from app.asr import CHUNK_SAMPLES
+from app.crud import audio as audio_crud
+from app.database import async_session
+
+logger = logging.getLogger(__name__)
+
+# Сколько транскрипций держать в памяти перед обращением к БД
+CACHE_SIZE = 1024
+
+
+def pcm_digest(filepath: Union[str, Path, IO[bytes]], block_samples: int = CHUNK_SAMPLES) -> str:
+    """sha256 декодированного звука: int16 PCM, частота и число каналов.
+
+    Хэшируется не файл, а сэмплы, поэтому одна и та же запись в другом
+    контейнере или с другими метаданными даёт тот же ключ.
+    """
+    digest = hashlib.sha256()
+    with sf.SoundFile(filepath) as f:
+        digest.update(f"{f.samplerate}:{f.channels}:".encode("ascii"))
+        for block in f.blocks(blocksize=block_samples, dtype="int16"):
+            digest.update(block.tobytes())
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """Кэш готовых транскрипций по хэшу звука и версии моделей.
+
+    Первый уровень — LRU в памяти на max_items записей, второй — строки
+    audio_files со статусом done, у которых совпадают content_hash и
+    model_version. Смена любой из моделей меняет версию: старые записи
+    перестают совпадать, а LRU очищается.
+    """
+
+    def __init__(self, model_version: Callable[[], str], max_items: int = CACHE_SIZE) -> None:
+        self._model_version = model_version
+        self.max_items = max_items
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @property
+    def model_version(self) -> str:
+        return self._sync_version()
+
+    def _sync_version(self) -> str:
+        version = self._model_version()
+        if version != self._version:
+            with self._lock:
+                if self._items:
+                    logger.info("Версия моделей сменилась, кэш транскрипций сброшен")
+                self._items.clear()
+                self._version = version
+        return version
+
+    def _get_local(self, digest: str) -> Optional[str]:
+        with self._lock:
+            text = self._items.get(digest)
+            if text is not None:
+                self._items.move_to_end(digest)
+            return text
+
+    def put(self, digest: str, text: str) -> None:
+        self._sync_version()
+        with self._lock:
+            self._items[digest] = text
+            self._items.move_to_end(digest)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    async def get(self, digest: str) -> Optional[str]:
+        version = self.model_version
+        text = self._get_local(digest)
+        if text is not None:
+            self.memory_hits += 1
+            return text
+        async with async_session() as session:
+            text = await audio_crud.find_transcription(session, digest, version)
+        if text is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self.put(digest, text)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "model_version": self._version,
+            "items": len(self._items),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0,
+        }
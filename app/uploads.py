@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, AsyncIterable, Optional
+
+from litestar import Request
+from vosk import Model
+
+from app.asr import StreamingDecoder, decode_file
+from app.metrics import observe_stage, timed_chunks
+from app.streaming import MultipartFile, WavStreamParser
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path("uploads")
+
+# Файлы, которым нужен seek (mp3, ogg, ...), держим в памяти до этого размера
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Сколько чанков может ждать записи на диск, прежде чем приём загрузки притормозит
+WRITE_MAX_PENDING = 32
+
+
+class ChunkWriter:
+    """Пишет чанки в файл из отдельного потока: диск не блокирует event loop.
+
+    Очередь ограничена: если диск не успевает, write() ждёт, и приём
+    загрузки притормаживает вместе с ним. После finish() файл остаётся
+    открытым (spool ещё читают), закрывает его aclose().
+    """
+
+    def __init__(self, file: IO[bytes], max_pending: int = WRITE_MAX_PENDING) -> None:
+        self.file = file
+        self.size = 0
+        self.seconds = 0.0
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, name="upload-writer", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    async def open(cls, path: Path) -> "ChunkWriter":
+        return cls(await asyncio.to_thread(open, path, "wb"))
+
+    async def write(self, chunk: bytes) -> None:
+        if self._error is not None:
+            raise self._error
+        self.size += len(chunk)
+        # Пока очередь не полна, обходимся без переключения в поток
+        try:
+            self._queue.put_nowait(chunk)
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, chunk)
+
+    async def finish(self) -> None:
+        """Дожидается записи всех чанков."""
+        await asyncio.to_thread(self._finish)
+        if self._error is not None:
+            raise self._error
+
+    async def aclose(self) -> None:
+        """Останавливает поток (недописанное отбрасывается) и закрывает файл."""
+        self._cancelled = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        await asyncio.to_thread(self._close)
+
+    def _finish(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self.file.flush()
+
+    def _close(self) -> None:
+        self._thread.join()
+        self.file.close()
+
+    def _run(self) -> None:
+        try:
+            while (chunk := self._queue.get()) is not None and not self._cancelled:
+                t0 = time.perf_counter()
+                self.file.write(chunk)
+                self.seconds += time.perf_counter() - t0
+        except Exception as e:
+            self._error = e
+            # Разгружаем очередь, чтобы отправитель не завис на put()
+            while not self._cancelled and self._queue.get() is not None:
+                pass
+
+
+async def open_upload(request: Request[Any, Any, Any]) -> MultipartFile:
+    """Начинает потоковое чтение файла из multipart-запроса."""
+    _, options = request.content_type
+    boundary = options.get("boundary")
+    if not boundary:
+        raise ValueError("Ожидался multipart/form-data с boundary")
+    upload = MultipartFile(request.stream(), boundary)
+    await upload.open()
+    return upload
+
+
+def new_upload_path(filename: str) -> Path:
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    return UPLOAD_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+
+
+async def save_upload(upload: MultipartFile, filepath: Path) -> int:
+    """Пишет файл на диск по чанкам, не держа его целиком в памяти."""
+    return await save_stream(timed_chunks(upload.chunks()), filepath)
+
+
+async def save_stream(chunks: AsyncIterable[bytes], filepath: Path) -> int:
+    writer = await ChunkWriter.open(filepath)
+    try:
+        async for chunk in chunks:
+            await writer.write(chunk)
+        await writer.finish()
+    finally:
+        await writer.aclose()
+    observe_stage("disk_write", writer.seconds)
+    return writer.size
+
+
+async def decode_upload(model: Model, upload: MultipartFile, save_to: Optional[Path] = None) -> str:
+    """Распознаёт загрузку, пока она ещё передаётся."""
+    return await decode_stream(model, timed_chunks(upload.chunks()), save_to)
+
+
+async def decode_stream(model: Model, chunks: AsyncIterable[bytes], save_to: Optional[Path] = None) -> str:
+    """Распознаёт поток байтов аудиофайла по мере поступления.
+
+    PCM16 WAV идёт в распознаватель прямо из сети (каналы сводятся, частота
+    понижается по ходу). Остальные форматы
+    сначала дописываются в save_to (или во временный spooled-файл), затем
+    декодируются целиком.
+    """
+    # Запись на диск (копии и spool-файла) идёт в потоках ChunkWriter, не в event loop
+    out: Optional[ChunkWriter] = await ChunkWriter.open(save_to) if save_to else None
+    spool: Optional[ChunkWriter] = None
+    parser = WavStreamParser()
+    decoder: Optional[StreamingDecoder] = None
+    head = b""
+    needs_file = False
+    try:
+        async for chunk in chunks:
+            if out is not None:
+                await out.write(chunk)
+            if decoder is not None:
+                await decoder.feed_async(parser.feed(chunk))
+                continue
+            if needs_file:
+                if spool is not None:
+                    await spool.write(chunk)
+                continue
+            head += chunk
+            try:
+                pcm = parser.feed(chunk)
+            except ValueError:
+                needs_file = True
+            else:
+                if not parser.header_done:
+                    continue
+                if parser.is_pcm16:
+                    decoder = StreamingDecoder(model, parser.samplerate, channels=parser.channels)
+                    await decoder.feed_async(pcm)
+                    head = b""
+                    continue
+                needs_file = True
+            if out is None:
+                spool = ChunkWriter(tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES))
+                await spool.write(head)
+            head = b""
+
+        if out is not None:
+            await out.finish()
+            observe_stage("disk_write", out.seconds)
+        if decoder is not None:
+            return await asyncio.to_thread(decoder.finish)
+        if out is not None and save_to is not None:
+            await out.aclose()
+            return await asyncio.to_thread(decode_file, model, save_to)
+        if spool is None:
+            # Файл оказался короче заголовка
+            spool = ChunkWriter(tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES))
+            await spool.write(head)
+        await spool.finish()
+        spool.file.seek(0)
+        return await asyncio.to_thread(decode_file, model, spool.file)
+    except BaseException:
+        if decoder is not None:
+            decoder.cancel()
+        raise
+    finally:
+        if out is not None:
+            await out.aclose()
+        if spool is not None:
+            await spool.aclose()
+
+
+# -------------------- ХРАНЕНИЕ ЗАГРУЗОК --------------------
+def cleanup_uploads(max_age_hours: float, upload_dir: Path = UPLOAD_DIR) -> int:
+    """Удаляет загрузки старше max_age_hours, возвращает число удалённых файлов."""
+    if not upload_dir.exists():
+        return 0
+    deadline = time.time() - max_age_hours * 3600
+    removed = 0
+    for path in upload_dir.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < deadline:
+                path.unlink()
+                removed += 1
+        except OSError as e:
+            logger.warning("Не удалось удалить %s: %s", path, e)
+    return removed
+
+
+async def run_upload_gc(max_age_hours: float, interval: float) -> None:
+    while True:
+        removed = await asyncio.to_thread(cleanup_uploads, max_age_hours)
+        if removed:
+            logger.info("Удалено старых загрузок: %d", removed)
+        await asyncio.sleep(interval)
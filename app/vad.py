@@ -0,0 +1,181 @@
+import os
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Вырезать тишину перед распознавателем; ASR_VAD=0 подаёт звук целиком, как раньше
+ENABLED = os.getenv("ASR_VAD", "1") == "1"
+
+# Длина кадра анализа
+FRAME_MS = 20
+# Порог начала речи: не тише START_DB dBFS и на START_MARGIN_DB выше уровня шума
+START_DB = -45.0
+START_MARGIN_DB = 10.0
+# Гистерезис: начавшаяся речь продолжается, пока уровень не упадёт ниже порога начала на столько
+HYSTERESIS_DB = 6.0
+# Глухие согласные (с, ш, ф, х) тихие, но с частыми переходами через ноль: они тоже речь,
+# если громче порога окончания
+FRICATIVE_ZCR = 0.25
+# Сколько тишины ещё подаётся после речи и до неё, чтобы не срезать края слов
+HANGOVER_MS = 300
+PADDING_MS = 200
+# После такой паузы фраза закрывается: распознаватель отдаёт финальный результат
+PAUSE_MS = 1000
+# Уровень шума следует за тихими кадрами: вниз сразу, вверх не быстрее FLOOR_RISE_DB в секунду
+FLOOR_RISE_DB = 1.0
+
+# Элемент выхода гейта: PCM для распознавателя или None — долгая пауза, фразу пора закрыть
+Piece = Optional[bytes]
+
+_NEVER = -(1 << 62)
+
+
+def fingerprint() -> str:
+    """Настройки, от которых зависит текст: входят в версию моделей для кэша транскрипций."""
+    if not ENABLED:
+        return "vad=off"
+    return f"vad={START_DB}/{START_MARGIN_DB}/{HYSTERESIS_DB}/{FRICATIVE_ZCR}/{HANGOVER_MS}/{PADDING_MS}/{PAUSE_MS}"
+
+
+def frame_features(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(n, frame) int16 -> уровень в dBFS и доля переходов через ноль для каждого кадра."""
+    x = frames.astype(np.float32)
+    rms = np.sqrt(np.einsum("ij,ij->i", x, x) / frames.shape[1])
+    db = 20 * np.log10(np.maximum(rms, 1.0) / 32768)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frames.shape[1] - 1)
+    return db, zcr
+
+
+class VoiceGate:
+    """Детектор речи по энергии и переходам через ноль перед распознавателем.
+
+    Звук режется на кадры по FRAME_MS; признаки и решения считаются для всех
+    кадров блока разом. Речь начинается выше порога начала и длится, пока
+    уровень не опустится ниже порога окончания (гистерезис), плюс hangover
+    после неё. Перед каждым началом речи подаётся padding тишины: до решения
+    эти кадры ждут в буфере, в том числе через границу блоков. Остальная
+    тишина выбрасывается, а после паузы длиннее pause в выход попадает None.
+    """
+
+    def __init__(self, samplerate: int, frame_ms: int = FRAME_MS, hangover_ms: int = HANGOVER_MS,
+                 padding_ms: int = PADDING_MS, pause_ms: int = PAUSE_MS) -> None:
+        self.samplerate = samplerate
+        self.frame = max(1, samplerate * frame_ms // 1000)
+        self.hangover = hangover_ms // frame_ms
+        self.padding = padding_ms // frame_ms
+        self.pause = max(pause_ms // frame_ms, self.hangover + 1)
+        # Начинаем с тихой оценки: лишняя тишина в распознавателе лучше срезанного первого слова
+        self.floor_db = START_DB - START_MARGIN_DB
+        self._rise = FLOOR_RISE_DB * frame_ms / 1000
+        self.total_samples = 0
+        self.kept_samples = 0
+        self._speaking = False
+        self._last_speech = _NEVER  # номер последнего кадра речи
+        self._frames = 0  # сколько целых кадров уже разобрано
+        self._rest = np.zeros(0, dtype=np.int16)  # хвост короче кадра
+        self._pending = np.zeros((0, self.frame), dtype=np.int16)  # тишина, которая может стать полем перед речью
+
+    @property
+    def skipped_seconds(self) -> float:
+        return (self.total_samples - self.kept_samples) / self.samplerate
+
+    @property
+    def total_seconds(self) -> float:
+        return self.total_samples / self.samplerate
+
+    @property
+    def skipped_ratio(self) -> float:
+        return 1 - self.kept_samples / self.total_samples if self.total_samples else 0.0
+
+    def _thresholds(self, db: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # floor[i] = min(db[i], floor[i-1] + rise) без цикла: min_j(db[j] + rise*(i-j))
+        ramp = self._rise * np.arange(1, len(db) + 1)
+        floor = np.minimum(np.minimum.accumulate(db - ramp) + ramp, self.floor_db + ramp)
+        self.floor_db = float(floor[-1])
+        start = np.maximum(START_DB, floor + START_MARGIN_DB)
+        return start, start - HYSTERESIS_DB
+
+    def process(self, pcm: bytes) -> List[Piece]:
+        """Моно PCM16 -> куски для распознавателя и отметки долгих пауз, по порядку."""
+        samples = np.frombuffer(pcm, dtype="<i2")
+        self.total_samples += len(samples)
+        if len(self._rest):
+            samples = np.concatenate((self._rest, samples))
+        n = len(samples) // self.frame
+        self._rest = samples[n * self.frame:]
+        if not n:
+            return []
+        frames = samples[:n * self.frame].reshape(n, self.frame)
+        db, zcr = frame_features(frames)
+        start_db, stop_db = self._thresholds(db)
+
+        # Гистерезис: выше порога начала — речь, ниже порога окончания — тишина,
+        # между ними — то же состояние, что у предыдущего кадра
+        code = np.where(db >= start_db, 1, np.where(db < stop_db, 0, -1))
+        code[(code < 0) & (zcr >= FRICATIVE_ZCR)] = 1
+        decided = np.maximum.accumulate(np.where(code >= 0, np.arange(n), -1))
+        speech = np.where(decided >= 0, code[np.maximum(decided, 0)] == 1, self._speaking)
+        self._speaking = bool(speech[-1])
+
+        # Расстояние до последнего кадра речи (с учётом прошлых блоков): hangover и паузы
+        positions = self._frames + np.arange(n)
+        last = np.maximum(np.maximum.accumulate(np.where(speech, positions, _NEVER)), self._last_speech)
+        since = positions - last
+        self._last_speech = int(last[-1])
+        self._frames += n
+
+        # Поля перед речью: padding кадров до каждого звучащего, включая отложенные с прошлого блока
+        held = len(self._pending)
+        frames = np.concatenate((self._pending, frames)) if held else frames
+        keep = np.concatenate((np.zeros(held, dtype=bool), since <= self.hangover))
+        index = np.arange(len(keep))
+        upcoming = np.minimum.accumulate(np.where(keep, index, len(keep) + self.padding)[::-1])[::-1]
+        keep |= upcoming - index <= self.padding
+        kept = np.flatnonzero(keep)
+        tail = kept[-1] + 1 if len(kept) else 0
+        self._pending = frames[max(tail, len(frames) - self.padding):] if self.padding else frames[:0]
+
+        pauses = (held + np.flatnonzero(since == self.pause)).tolist()
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], keep.view(np.int8), [0]))))
+        out: List[Piece] = []
+        for begin, end in zip(edges[::2], edges[1::2]):
+            # Пауза, пришедшая на поле перед речью, всё равно закрывает фразу до этой речи
+            while pauses and pauses[0] < end:
+                pauses.pop(0)
+                out.append(None)
+            out.append(frames[begin:end].tobytes())
+            self.kept_samples += int(end - begin) * self.frame
+        out.extend(None for _ in pauses)
+        return out
+
+    def flush(self) -> List[Piece]:
+        """Конец записи: отдаёт неполный последний кадр, если на нём шла речь."""
+        rest, self._rest = self._rest, self._rest[:0]
+        self._pending = self._pending[:0]
+        if len(rest) and self._frames - self._last_speech <= self.hangover:
+            self.kept_samples += len(rest)
+            return [rest.tobytes()]
+        return []
+
+
+def feed(rec: Any, gate: Optional[VoiceGate], pcm: bytes, on_result: Callable[[str], None]) -> None:
+    """Подаёт PCM в распознаватель через гейт; on_result получает JSON законченных фраз.
+
+    Без гейта — как раньше, PCM целиком. На долгой паузе фраза закрывается
+    FinalResult(): распознаватель не ждёт начала следующей речи.
+    """
+    for piece in gate.process(pcm) if gate is not None else (pcm,):
+        if piece is None:
+            on_result(rec.FinalResult())
+        elif rec.AcceptWaveform(piece):
+            on_result(rec.Result())
+
+
+def flush(rec: Any, gate: Optional[VoiceGate], on_result: Callable[[str], None]) -> None:
+    """Дописывает в распознаватель то, что гейт придержал к концу записи."""
+    if gate is None:
+        return
+    for piece in gate.flush():
+        if piece is not None and rec.AcceptWaveform(piece):
+            on_result(rec.Result())
@@ -4,112 +4,58 @@ from litestar.response import Template
 from litestar.enums import RequestEncodingType
 from litestar.params import Body
 import sounddevice as sd
-import queue, threading, json, os
-from vosk import Model, KaldiRecognizer
-import soundfile as sf
-from transformers import pipeline, AutoTokenizer
+import os, queue, threading, json, uuid
+from vosk import KaldiRecognizer
 from pathlib import Path
-from typing import Dict, Any
-
-# -------------------- VOSK МОДЕЛЬ --------------------
-MODEL_PATH = "models/vosk-model-small-ru-0.22"
-vosk_model = Model(MODEL_PATH)
-
-# -------------------- RUPUNCT МОДЕЛЬ --------------------
-PUNCT_MODEL_PATH = "models/RUPunct_big"
-tk = AutoTokenizer.from_pretrained(PUNCT_MODEL_PATH, strip_accents=False, add_prefix_space=True)
-classifier = pipeline(
-    "ner",
-    model=PUNCT_MODEL_PATH,
-    tokenizer=tk,
-    aggregation_strategy="first",
-    device=-1
+from typing import Dict, Any, Callable, Optional
+from app import vad
+from app.audio_frontend import AudioFrontend
+from app.crud.live import get_segments, save_segments
+from app.database import async_session
+from app.group_commit import GroupCommitWriter
+from app.mic_sessions import SegmentStore
+from app.pipeline import Pipeline
+from app.registry import registry
+from app.vad import VoiceGate
+
+# -------------------- МОДЕЛИ --------------------
+# Загружаются лениво общим реестром процесса (app/registry.py)
+
+
+# Фразы микрофона пишутся в live_segments пачками, как у основного сервера
+LIVE_WRITE_BATCH = int(os.getenv("LIVE_WRITE_BATCH", "256"))
+LIVE_WRITE_DELAY_MS = float(os.getenv("LIVE_WRITE_DELAY_MS", "500"))
+PAGE_LIMIT_MAX = int(os.getenv("PAGE_LIMIT_MAX", "200"))
+
+live_writer: GroupCommitWriter[Dict[str, Any]] = GroupCommitWriter(
+    save_segments, LIVE_WRITE_BATCH, LIVE_WRITE_DELAY_MS / 1000, name="live-writer"
 )
 
+
+def new_segment_store(session_id: str) -> SegmentStore:
+    """Фразы держим в памяти (поток микрофона не ждёт БД), копия уходит в live_segments в фоне."""
+    def persist(position: int, seq: int, text: str) -> None:
+        try:
+            live_writer.submit_threadsafe({"session_id": session_id, "position": position, "seq": seq, "text": text})
+        except RuntimeError as e:
+            print(f"⚠ Фраза {session_id[:8]}#{position} не сохранена: {e}")
+
+    return SegmentStore(on_change=persist)
+
+
 # Глобальное состояние приложения
-app_state = {
+app_state: Dict[str, Any] = {
     "stop_mic": False,
     "q": queue.Queue(),
-    "mic_active": False
+    "mic_active": False,
+    "session_id": None,
+    "segments": SegmentStore(),
 }
 
 
-def process_token(token, label):
-    mapping = {
-        "LOWER_O": token,
-        "LOWER_PERIOD": token + ".",
-        "LOWER_COMMA": token + ",",
-        "LOWER_QUESTION": token + "?",
-        "LOWER_TIRE": token + "—",
-        "LOWER_DVOETOCHIE": token + ":",
-        "LOWER_VOSKL": token + "!",
-        "LOWER_PERIODCOMMA": token + ";",
-        "LOWER_DEFIS": token + "-",
-        "LOWER_MNOGOTOCHIE": token + "...",
-        "LOWER_QUESTIONVOSKL": token + "?!",
-        "UPPER_O": token.capitalize(),
-        "UPPER_PERIOD": token.capitalize() + ".",
-        "UPPER_COMMA": token.capitalize() + ",",
-        "UPPER_QUESTION": token.capitalize() + "?",
-        "UPPER_TIRE": token.capitalize() + " —",
-        "UPPER_DVOETOCHIE": token.capitalize() + ":",
-        "UPPER_VOSKL": token.capitalize() + "!",
-        "UPPER_PERIODCOMMA": token.capitalize() + ";",
-        "UPPER_DEFIS": token.capitalize() + "-",
-        "UPPER_MNOGOTOCHIE": token.capitalize() + "...",
-        "UPPER_QUESTIONVOSKL": token.capitalize() + "?!",
-        "UPPER_TOTAL_O": token.upper(),
-        "UPPER_TOTAL_PERIOD": token.upper() + ".",
-        "UPPER_TOTAL_COMMA": token.upper() + ",",
-        "UPPER_TOTAL_QUESTION": token.upper() + "?",
-        "UPPER_TOTAL_TIRE": token.upper() + " —",
-        "UPPER_TOTAL_DVOETOCHIE": token.upper() + ":",
-        "UPPER_TOTAL_VOSKL": token.upper() + "!",
-        "UPPER_TOTAL_PERIODCOMMA": token.upper() + ";",
-        "UPPER_TOTAL_DEFIS": token.upper() + "-",
-        "UPPER_TOTAL_MNOGOTOCHIE": token.upper() + "...",
-        "UPPER_TOTAL_QUESTIONVOSKL": token.upper() + "?!",
-    }
-    return mapping.get(label, token)
-
-
-def split_text(text, chunk_size=200):
-    """Разделяет длинный текст на части по chunk_size слов."""
-    words = text.split()
-    for i in range(0, len(words), chunk_size):
-        yield " ".join(words[i:i + chunk_size])
-
-
-def restore_punctuation(raw_text: str) -> str:
-    """Применяет RUPunct для восстановления пунктуации"""
-    output = ""
-    for chunk in split_text(raw_text):
-        preds = classifier(chunk)
-        if not preds:
-            continue
-        for item in preds:
-            output += " " + process_token(item["word"].strip(), item["entity_group"])
-    return output.strip()
-
-
 # -------------------- РАСПОЗНАВАНИЕ ФАЙЛА --------------------
-def transcribe_file(filepath):
-    data, samplerate = sf.read(filepath, dtype="int16")
-    rec = KaldiRecognizer(vosk_model, samplerate)
-    result = []
-
-    for chunk in range(0, len(data), 16000):
-        if rec.AcceptWaveform(data[chunk:chunk + 16000].tobytes()):
-            res = json.loads(rec.Result())
-            if res.get("text"):
-                result.append(res["text"])
-
-    res = json.loads(rec.FinalResult())
-    if res.get("text"):
-        result.append(res["text"])
-
-    raw_text = " ".join(result)
-    return restore_punctuation(raw_text) if raw_text else ""
+# Тот же конвейер, что у основного сервера (app/pipeline.py), но без пула процессов
+pipeline = Pipeline(registry)
 
 
 @post("/upload")
@@ -125,15 +71,23 @@ async def upload_audio(data: Dict[str, UploadFile] = Body(media_type=RequestEnco
     with open(filepath, "wb") as f:
         f.write(content)
 
-    text = transcribe_file(filepath)
+    text = await pipeline.transcribe(filepath)
     return {"text": text}
 
 
 # -------------------- РАСПОЗНАВАНИЕ С МИКРОФОНА --------------------
-def mic_worker(samplerate, device, callback):
-    rec = KaldiRecognizer(vosk_model, samplerate)
-
-    def sd_callback(indata, frames, time, status):
+def mic_worker(samplerate: int, device: Optional[int], callback: Callable[[str], None]) -> None:
+    # Микрофон пишет на своей частоте (44.1/48 кГц); Vosk получает звук на частоте модели
+    frontend = AudioFrontend(samplerate)
+    rec = KaldiRecognizer(registry.vosk_model, frontend.out_rate)
+    gate = VoiceGate(frontend.out_rate) if vad.ENABLED else None
+
+    def on_result(raw: str) -> None:
+        result = json.loads(raw)
+        if result.get("text"):
+            callback(result["text"])
+
+    def sd_callback(indata: Any, frames: int, time: Any, status: Any) -> None:
         if status:
             print("⚠", status)
         app_state["q"].put(bytes(indata))
@@ -143,10 +97,11 @@ def mic_worker(samplerate, device, callback):
                            callback=sd_callback):
         while not app_state["stop_mic"]:
             data = app_state["q"].get()
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                if result.get("text"):
-                    callback(result["text"])
+            pcm = frontend.process_bytes(data)
+            if pcm:
+                vad.feed(rec, gate, pcm, on_result)
+    vad.flush(rec, gate, on_result)
+    on_result(rec.FinalResult())
 
 
 @post("/start_mic")
@@ -154,14 +109,15 @@ async def start_mic() -> Dict[str, Any]:
     app_state["stop_mic"] = False
     app_state["mic_active"] = True
     samplerate = int(sd.query_devices(None, "input")["default_samplerate"])
+    # Каждый запуск — новая сессия: после перезапуска или в другом воркере её фразы читаются из БД
+    session_id = app_state["session_id"] = uuid.uuid4().hex
+    segments = app_state["segments"] = new_segment_store(session_id)
 
-    def send_update(text):
-        restored = restore_punctuation(text)
-        with open("mic_result.txt", "a", encoding="utf-8") as f:
-            f.write(restored + "\n")
+    def send_update(text: str) -> None:
+        segments.append(pipeline.restore_punctuation(text))
 
     threading.Thread(target=mic_worker, args=(samplerate, None, send_update), daemon=True).start()
-    return {"status": "mic started"}
+    return {"status": "mic started", "session_id": session_id}
 
 
 @post("/stop_mic")
@@ -172,11 +128,16 @@ async def stop_mic_recording() -> Dict[str, Any]:
 
 
 @get("/get_mic")
-async def get_mic() -> Dict[str, Any]:
-    if os.path.exists("mic_result.txt"):
-        with open("mic_result.txt", "r", encoding="utf-8") as f:
-            return {"text": f.read()}
-    return {"text": ""}
+async def get_mic(session_id: Optional[str] = None, since: int = 0) -> Dict[str, Any]:
+    """Фразы после курсора since; чужая или прошлая сессия читается из live_segments."""
+    if session_id and session_id != app_state["session_id"]:
+        async with async_session() as session:
+            page = await get_segments(session, session_id, since, PAGE_LIMIT_MAX)
+        return {"session_id": session_id, "text": "\n".join(seg.text for seg in page.segments),
+                "segments": [{"index": seg.index, "text": seg.text} for seg in page.segments], "next": page.next}
+    segments, cursor = app_state["segments"].since(since)
+    return {"session_id": app_state["session_id"], "text": "\n".join(seg["text"] for seg in segments),
+            "segments": segments, "next": cursor}
 
 
 # -------------------- ФРОНТ --------------------
@@ -194,5 +155,7 @@ app = Litestar(
         stop_mic_recording,
         get_mic
     ],
+    on_startup=[live_writer.start],
+    on_shutdown=[live_writer.stop],
     debug=True
 )
\ No newline at end of file
@@ -1,8 +1,27 @@
 # app_module.py
-from litestar import Litestar, get
+"""Запуск под Granian с несколькими воркерами.
 
-@get("/")
-async def index() -> dict:
-    return {"status": "ok", "message": "Granian + Litestar работает!"}
+При PRELOAD_MODELS=1 модели загружаются в главном процессе до запуска
+воркеров: воркеры получают веса через fork (copy-on-write) и не грузят
+свои копии. Запуск: python app_module.py
+"""
+import multiprocessing
+import os
+import sys
 
-app = Litestar(route_handlers=[index], openapi_config=None)
+from main import app  # noqa: F401
+
+GRANIAN_WORKERS = int(os.getenv("GRANIAN_WORKERS", "2"))
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") == "1"
+
+if __name__ == "__main__":
+    from granian import Granian
+    from granian.constants import Interfaces
+
+    from app.registry import registry
+
+    if PRELOAD_MODELS and sys.platform != "win32":
+        multiprocessing.set_start_method("fork", force=True)
+        registry.preload()
+
+    Granian("main:app", address="0.0.0.0", port=8000, interface=Interfaces.ASGI, workers=GRANIAN_WORKERS).serve()
@@ -1,104 +1,216 @@
-from litestar import Litestar, get, post
-from litestar.datastructures import UploadFile
-from litestar.enums import RequestEncodingType
-from litestar.params import Body
+from litestar import Litestar, Request, WebSocket, get, post, websocket
 from litestar import Response
-from typing import Dict, Any, List
+from litestar.response import ServerSentEvent, ServerSentEventMessage
+from typing import AsyncIterator, Dict, Any, List, Optional
 import sounddevice as sd
-import queue, threading, json, os
-from vosk import Model, KaldiRecognizer
-import soundfile as sf
-from transformers import pipeline, AutoTokenizer
+import asyncio, json, os
 from pathlib import Path
 import logging
 from datetime import datetime
+from litestar.di import Provide
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import async_session, provide_session
+from app.crud.audio import apply_updates, create_audio, create_audio_batch, get_audio_json, list_audio_json, search_audio_json
+from app.crud.live import get_segments, get_segments_json, save_segments
+from app.jobs import JobQueue, JobResult
+from app.scheduler import JobScheduler, SchedulerFull, probe_duration
+from app.metrics import REGISTRY, metrics_middleware, timed_chunks
+from app.group_commit import GroupCommitWriter
+from app.ingest import Downloader, is_remote, url_filename
+from app.schemas import BatchSubmitSchema
+from app.asr import VoskExecutor
+from app import punctuation
+from app.registry import registry
+from app.pipeline import Pipeline
+from app.punct_batcher import PunctuationBatcher
+from app.live import run_live_socket
+from app.transcript_cache import TranscriptCache, pcm_digest
+from app.mic_sessions import MicSession, MicSessionRegistry
+from app.uploads import (decode_stream, decode_upload, new_upload_path, open_upload, run_upload_gc, save_stream,
+                         save_upload)
 
 # -------------------- ЛОГИРОВАНИЕ --------------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # -------------------- НАСТРОЙКА --------------------
-q = queue.Queue()
-stop_mic = False
-mic_results: List[str] = []
-
-MODEL_PATH = r"models/vosk-model-small-ru-0.22"
-PUNCT_MODEL_PATH = r"models/RUPunct_big"
-
-print("🔄 Загрузка моделей...")
-try:
-    vosk_model = Model(MODEL_PATH)
-    tk = AutoTokenizer.from_pretrained(PUNCT_MODEL_PATH, strip_accents=False, add_prefix_space=True)
-    classifier = pipeline("ner", model=PUNCT_MODEL_PATH, tokenizer=tk, aggregation_strategy="first", device=-1)
-    print("✅ Модели загружены!")
-except Exception as e:
-    print(f"❌ Ошибка загрузки моделей: {e}")
-    raise
-
-
-def process_token(token, label):
-    mapping = {
-        "LOWER_O": token, "LOWER_PERIOD": token + ".", "LOWER_COMMA": token + ",",
-        "LOWER_QUESTION": token + "?", "LOWER_TIRE": token + "—", "LOWER_DVOETOCHIE": token + ":",
-        "LOWER_VOSKL": token + "!", "LOWER_PERIODCOMMA": token + ";", "LOWER_DEFIS": token + "-",
-        "LOWER_MNOGOTOCHIE": token + "...",
-        "UPPER_O": token.capitalize(), "UPPER_PERIOD": token.capitalize() + ".",
-        "UPPER_COMMA": token.capitalize() + ",", "UPPER_QUESTION": token.capitalize() + "?",
-        "UPPER_TIRE": token.capitalize() + " —", "UPPER_DVOETOCHIE": token.capitalize() + ":",
-        "UPPER_VOSKL": token.capitalize() + "!", "UPPER_PERIODCOMMA": token.capitalize() + ";",
-        "UPPER_DEFIS": token.capitalize() + "-", "UPPER_MNOGOTOCHIE": token.capitalize() + "...",
-        "UPPER_TOTAL_O": token.upper(), "UPPER_TOTAL_PERIOD": token.upper() + ".",
-        "UPPER_TOTAL_COMMA": token.upper() + ",", "UPPER_TOTAL_QUESTION": token.upper() + "?",
-        "UPPER_TOTAL_TIRE": token.upper() + " —", "UPPER_TOTAL_DVOETOCHIE": token.upper() + ":",
-        "UPPER_TOTAL_VOSKL": token.upper() + "!", "UPPER_TOTAL_PERIODCOMMA": token.upper() + ";",
-        "UPPER_TOTAL_DEFIS": token.upper() + "-", "UPPER_TOTAL_MNOGOTOCHIE": token.upper() + "...",
-    }
-    return mapping.get(label, token)
+MODEL_PATH = registry.vosk_path
+# 0 — распознавать в потоке основного процесса, без пула
+ASR_PROCESSES = int(os.getenv("ASR_PROCESSES", str(os.cpu_count() or 1)))
+ASR_MAX_INFLIGHT = int(os.getenv("ASR_MAX_INFLIGHT", str(ASR_PROCESSES * 2)))
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", str(max(2, ASR_MAX_INFLIGHT))))
+# Записи длиннее порога распознаются параллельно по окнам (0 — выключено)
+SEGMENT_PARALLEL_MIN_SECONDS = float(os.getenv("SEGMENT_PARALLEL_MIN_SECONDS", "600"))
+SEGMENT_WINDOW_SECONDS = float(os.getenv("SEGMENT_WINDOW_SECONDS", "60"))
+SEGMENT_OVERLAP_SECONDS = float(os.getenv("SEGMENT_OVERLAP_SECONDS", "5"))
+# Сколько часов хранить uploads/: 0 — удалять сразу после распознавания, <0 — хранить всегда
+UPLOAD_RETENTION_HOURS = float(os.getenv("UPLOAD_RETENTION_HOURS", "24"))
+UPLOAD_GC_INTERVAL = float(os.getenv("UPLOAD_GC_INTERVAL", "600"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+# Пакетная постановка URL и их скачивание
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "10000"))
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "64"))
+DOWNLOAD_PER_HOST = int(os.getenv("DOWNLOAD_PER_HOST", "8"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+PUNCT_BATCH_SIZE = int(os.getenv("PUNCT_BATCH_SIZE", str(punctuation.BATCH_SIZE)))
+PUNCT_MAX_TOKENS = int(os.getenv("PUNCT_MAX_TOKENS", str(punctuation.MAX_TOKENS)))
+PUNCT_CONTEXT_WORDS = int(os.getenv("PUNCT_CONTEXT_WORDS", str(punctuation.CONTEXT_WORDS)))
+# Общий батчер пунктуации: сброс по PUNCT_BATCH_SIZE окнам или по таймауту
+PUNCT_MAX_DELAY_MS = float(os.getenv("PUNCT_MAX_DELAY_MS", "20"))
+# Допуск задач: не больше SCHED_MAX_JOBS в очереди и SCHED_MAX_BACKLOG_HOURS аудио;
+# порядок — сначала короткие, SCHED_AGING секунд аудио за секунду ожидания
+SCHED_MAX_JOBS = int(os.getenv("SCHED_MAX_JOBS", "1000"))
+SCHED_MAX_BACKLOG_HOURS = float(os.getenv("SCHED_MAX_BACKLOG_HOURS", "24"))
+SCHED_AGING = float(os.getenv("SCHED_AGING", "10"))
+# Двухуровневый режим (задан VOSK_REFINE_MODEL_PATH): /upload сразу даёт черновик модели запросов,
+# модель уточнения в фоне заменяет его. Процессор делится числом процессов — ASR_PROCESSES
+# на черновики, REFINE_PROCESSES на уточнение, — а REFINE_NICE понижает приоритет уточнения,
+# чтобы под нагрузкой оно уступало черновикам. REFINE_PROCESSES=0 — уточнять в потоках основного процесса
+REFINE_PROCESSES = int(os.getenv("REFINE_PROCESSES", str(max(1, (os.cpu_count() or 1) // 4))))
+REFINE_MAX_INFLIGHT = int(os.getenv("REFINE_MAX_INFLIGHT", str(max(1, REFINE_PROCESSES))))
+REFINE_NICE = int(os.getenv("REFINE_NICE", "10"))
+TIERED = registry.refine_path is not None
+# Одновременные /upload/stream: распознаются в основном процессе, мимо очереди
+STREAM_MAX_ACTIVE = int(os.getenv("STREAM_MAX_ACTIVE", "4"))
+STREAM_RETRY_AFTER = 5
+# Групповая фиксация статусов задач: до DB_WRITE_BATCH строк за транзакцию
+DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "256"))
+DB_WRITE_DELAY_MS = float(os.getenv("DB_WRITE_DELAY_MS", "5"))
+# Фразы живых сессий пишутся в live_segments пачками: до LIVE_WRITE_BATCH строк или раз в LIVE_WRITE_DELAY_MS
+LIVE_WRITE_BATCH = int(os.getenv("LIVE_WRITE_BATCH", "256"))
+LIVE_WRITE_DELAY_MS = float(os.getenv("LIVE_WRITE_DELAY_MS", "500"))
+# Размер страницы списков /jobs и /search
+PAGE_LIMIT_MAX = int(os.getenv("PAGE_LIMIT_MAX", "200"))
+# Сколько готовых транскрипций держать в памяти (второй уровень кэша — audio_files в БД)
+TRANSCRIPT_CACHE_SIZE = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "1024"))
+# Размер кадра живого распознавания по WebSocket, мс
+WS_BLOCK_MS = int(os.getenv("WS_BLOCK_MS", "200"))
+# Сессии серверного микрофона
+MIC_BLOCKSIZE = int(os.getenv("MIC_BLOCKSIZE", "16000"))
+MIC_BUFFER_BLOCKS = int(os.getenv("MIC_BUFFER_BLOCKS", "32"))
+MIC_MAX_SESSIONS = int(os.getenv("MIC_MAX_SESSIONS", "8"))
+# Живая пунктуация: левый контекст и сколько слов предыдущей фразы можно переразметить
+LIVE_CONTEXT_WORDS = int(os.getenv("LIVE_CONTEXT_WORDS", str(punctuation.LIVE_CONTEXT_WORDS)))
+LIVE_REVISE_WORDS = int(os.getenv("LIVE_REVISE_WORDS", str(punctuation.LIVE_REVISE_WORDS)))
+
+# Модели грузятся лениво через реестр (app/registry.py), а при старте — в фоне
+punct_batcher = PunctuationBatcher(
+    lambda: registry.classifier, max_batch=PUNCT_BATCH_SIZE, max_delay=PUNCT_MAX_DELAY_MS / 1000,
+    max_tokens=PUNCT_MAX_TOKENS, context_words=PUNCT_CONTEXT_WORDS,
+)
+
+
+def models_not_ready() -> Optional[Dict[str, Any]]:
+    if registry.ready:
+        return None
+    return {"status": "error", "message": f"Модели ещё не готовы ({registry.state})"}
+
+
+# -------------------- ОЧЕРЕДЬ ЗАДАЧ --------------------
+asr_executor = VoskExecutor(MODEL_PATH, ASR_PROCESSES, ASR_MAX_INFLIGHT) if ASR_PROCESSES > 0 else None
+pipeline = Pipeline(registry, punct_batcher, asr_executor, SEGMENT_PARALLEL_MIN_SECONDS,
+                    SEGMENT_WINDOW_SECONDS, SEGMENT_OVERLAP_SECONDS)
+refine_path = registry.refine_path
+refine_executor = VoskExecutor(refine_path, REFINE_PROCESSES, REFINE_MAX_INFLIGHT, nice=REFINE_NICE) \
+    if refine_path is not None and REFINE_PROCESSES > 0 else None
+refine_pipeline = Pipeline(registry, punct_batcher, refine_executor, SEGMENT_PARALLEL_MIN_SECONDS,
+                           SEGMENT_WINDOW_SECONDS, SEGMENT_OVERLAP_SECONDS, vosk_path=refine_path)
+
 
+downloader = Downloader(DOWNLOAD_CONNECTIONS, DOWNLOAD_PER_HOST, DOWNLOAD_RETRIES)
 
-def split_text(text, chunk_size=200):
-    words = text.split()
-    for i in range(0, len(words), chunk_size):
-        yield " ".join(words[i:i + chunk_size])
 
+def draft_fields(text: str) -> Dict[str, Any]:
+    """Поля строки с черновиком, который ещё заменит уточнение."""
+    return {"draft_transcription": text, "draft_model_version": registry.model_version, "refine_status": "queued"}
 
-def restore_punctuation(raw_text: str) -> str:
-    if not raw_text: return ""
+
+async def run_transcription(url: str) -> JobResult:
+    remote = is_remote(url)
+    refine = TIERED
     try:
-        output = ""
-        for chunk in split_text(raw_text):
-            preds = classifier(chunk)
-            if not preds: continue
-            for item in preds:
-                output += " " + process_token(item["word"].strip(), item["entity_group"])
-        return output.strip()
-    except Exception as e:
-        print(f"Ошибка пунктуации: {e}")
-        return raw_text
+        text = await (_transcribe_remote(url) if remote else pipeline.transcribe(url))
+    except Exception:
+        refine = False
+        raise
+    finally:
+        # Файл нужен уточнению — тогда удалит его оно
+        if not remote and UPLOAD_RETENTION_HOURS == 0 and not refine:
+            Path(url).unlink(missing_ok=True)
+    if not refine:
+        return text
+    return {"transcription": text, **draft_fields(text)}
+
+
+async def run_refinement(url: str) -> JobResult:
+    remote = is_remote(url)
+    filepath = Path(url)
+    try:
+        if remote:
+            # Пулу уточнения нужен файл на диске: удалённый звук скачиваем ещё раз во временную копию
+            filepath = new_upload_path(url_filename(url))
+            await save_stream(timed_chunks(downloader.stream(url), "download"), filepath)
+        text = await refine_pipeline.transcribe(filepath)
+    finally:
+        if remote or UPLOAD_RETENTION_HOURS == 0:
+            filepath.unlink(missing_ok=True)
+    return {"transcription": text, "model_version": registry.refine_version}
+
+
+async def _transcribe_remote(url: str) -> str:
+    # Скачивание идёт прямо в распознаватель, копия сохраняется только при включённом хранении
+    filepath = new_upload_path(url_filename(url)) if UPLOAD_RETENTION_HOURS != 0 else None
+    raw_text = await decode_stream(registry.vosk_model, timed_chunks(downloader.stream(url), "download"), filepath)
+    return await pipeline.restore_punctuation_async(raw_text)
+
+
+status_writer: GroupCommitWriter[Dict[str, Any]] = GroupCommitWriter(
+    apply_updates, DB_WRITE_BATCH, DB_WRITE_DELAY_MS / 1000, name="status-writer"
+)
+scheduler = JobScheduler(SCHED_MAX_JOBS, SCHED_MAX_BACKLOG_HOURS * 3600,
+                         parallelism=min(TRANSCRIBE_WORKERS, ASR_PROCESSES or 1), aging=SCHED_AGING)
+# Уточнение не отклоняется: черновик уже отдан, очередь лишь откладывает замену текста
+refine_scheduler = JobScheduler(1_000_000, float("inf"), parallelism=REFINE_PROCESSES or 1, aging=SCHED_AGING)
+refine_queue = JobQueue(run_refinement, workers=REFINE_MAX_INFLIGHT, writer=status_writer, scheduler=refine_scheduler,
+                        status_column="refine_status")
+
+
+def submit_refinement(job_id: int, duration: Optional[float] = None) -> None:
+    # До запуска очереди уточнения строку с refine_status=queued найдёт её восстановление из БД
+    if refine_queue.started:
+        refine_queue.submit(job_id, duration, force=True)
+
 
+def queue_refinement(job_id: int, duration: Optional[float], fields: Dict[str, Any]) -> None:
+    if fields.get("refine_status") == "queued":
+        submit_refinement(job_id, duration)
 
-def transcribe_file(filepath: Path) -> str:
+
+job_queue = JobQueue(run_transcription, workers=TRANSCRIBE_WORKERS, writer=status_writer, scheduler=scheduler,
+                     on_done=queue_refinement)
+active_streams = 0
+
+
+def too_busy(retry_after: int, message: str) -> Response[Any]:
+    return Response(content={"status": "busy", "message": message, "retry_after": retry_after},
+                    status_code=429, headers={"Retry-After": str(retry_after)})
+
+# Повторно присланная запись не распознаётся заново: ключ — хэш звука и версия моделей
+# В двухуровневом режиме кэшируются только уточнённые тексты
+transcript_cache = TranscriptCache(lambda: registry.final_version, TRANSCRIPT_CACHE_SIZE)
+
+
+async def audio_digest(filepath: Path) -> Optional[str]:
     try:
-        data, samplerate = sf.read(filepath, dtype="int16")
-        rec = KaldiRecognizer(vosk_model, samplerate)
-        result = []
-        for chunk in range(0, len(data), 16000):
-            if chunk + 16000 <= len(data):
-                if rec.AcceptWaveform(data[chunk:chunk + 16000].tobytes()):
-                    res = json.loads(rec.Result())
-                    if res.get("text"): result.append(res["text"])
-        res = json.loads(rec.FinalResult())
-        if res.get("text"): result.append(res["text"])
-        raw_text = " ".join(result)
-        return restore_punctuation(raw_text)
+        return await asyncio.to_thread(pcm_digest, filepath)
     except Exception as e:
-        print(f"❌ Ошибка транскрипции файла: {e}")
-        return ""
+        print(f"⚠ Не удалось посчитать хэш {filepath}: {e}")
+        return None
 
 
 # -------------------- ROUTES --------------------
 @get("/")
-async def index() -> Response:
+async def index() -> Response[Any]:
     try:
         with open("app/web/templates/index.html", "r", encoding="utf-8") as f:  # ← НОВЫЙ ПУТЬ!
             html = f.read()
@@ -107,102 +219,409 @@ async def index() -> Response:
         return Response(content="<h1>❌ Не найдена app/web/templates/index.html</h1>", media_type="text/html")
 
 
-@post("/upload")
-async def upload_audio(data: Dict[str, UploadFile] = Body(media_type=RequestEncodingType.MULTI_PART)) -> Dict[str, Any]:
+@post("/upload", request_max_body_size=UPLOAD_MAX_BYTES)
+async def upload_audio(request: Request[Any, Any, Any]) -> Response[Any]:
+    # Очередь полна — отказываем до приёма тела
+    try:
+        scheduler.check()
+    except SchedulerFull as e:
+        return too_busy(e.retry_after, str(e))
     try:
-        file = data["file"]
-        upload_dir = Path("uploads")
-        upload_dir.mkdir(exist_ok=True)
-        filepath = upload_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        content = await file.read()
-        with open(filepath, "wb") as f:
-            f.write(content)
+        upload = await open_upload(request)
+        filepath = new_upload_path(upload.filename)
+        await save_upload(upload, filepath)
         print(f"📁 Файл сохранен: {filepath}")
-        text = transcribe_file(filepath)
-        return {"text": text, "status": "success", "filename": file.filename}
+        digest = await audio_digest(filepath)
+        cached = await transcript_cache.get(digest) if digest else None
+        if cached is not None:
+            # Дубликат: копия не нужна, ответ уже готов
+            filepath.unlink(missing_ok=True)
+            async with async_session() as session:
+                job_id = await create_audio(session, upload.filename, status="done", transcription=cached,
+                                            content_hash=digest, model_version=transcript_cache.model_version)
+            return Response(content={"id": job_id, "status": "done", "text": cached, "cached": True,
+                                     "filename": upload.filename})
+        # Длительность из заголовка: по ней очередь решает, принять ли задачу и когда её делать
+        duration = await asyncio.to_thread(probe_duration, str(filepath))
+        try:
+            scheduler.check(duration)
+        except SchedulerFull as e:
+            filepath.unlink(missing_ok=True)
+            return too_busy(e.retry_after, str(e))
+        async with async_session() as session:
+            job_id = await create_audio(session, str(filepath), content_hash=digest,
+                                        model_version=registry.model_version if digest else None)
+        job_queue.submit(job_id, duration, force=True)
+        return Response(content={"id": job_id, "status": "queued", "filename": upload.filename, "duration": duration})
     except Exception as e:
         print(f"❌ Ошибка загрузки: {e}")
-        return {"text": "", "status": "error", "message": str(e)}
+        return Response(content={"status": "error", "message": str(e)})
+
+
+@post("/upload/stream", request_max_body_size=UPLOAD_MAX_BYTES)
+async def upload_audio_stream(request: Request[Any, Any, Any]) -> Response[Any]:
+    """Распознаёт файл одновременно с приёмом и сразу возвращает текст."""
+    global active_streams
+    if (error := models_not_ready()) is not None:
+        return Response(content=error)
+    if active_streams >= STREAM_MAX_ACTIVE:
+        return too_busy(STREAM_RETRY_AFTER, "Слишком много потоковых загрузок")
+    active_streams += 1
+    filepath: Optional[Path] = None
+    try:
+        upload = await open_upload(request)
+        # Копия нужна хранению загрузок или уточнению, иначе звук идёт только в распознаватель
+        filepath = new_upload_path(upload.filename) if UPLOAD_RETENTION_HOURS != 0 or TIERED else None
+        raw_text = await decode_upload(registry.vosk_model, upload, filepath)
+        # Звук уже распознан по ходу приёма; по хэшу сохранённого файла можно пропустить пунктуацию
+        digest = await audio_digest(filepath) if filepath else None
+        cached = await transcript_cache.get(digest) if digest else None
+        text = cached if cached is not None else await pipeline.restore_punctuation_async(raw_text)
+        version = transcript_cache.model_version if cached is not None else registry.model_version
+        # Текст модели запросов окончательный, только если уточнение выключено
+        if digest and cached is None and not TIERED:
+            transcript_cache.put(digest, text)
+        refine = TIERED and cached is None and filepath is not None
+        if filepath is not None and UPLOAD_RETENTION_HOURS == 0 and not refine:
+            filepath.unlink(missing_ok=True)
+            filepath = None
+        async with async_session() as session:
+            job_id = await create_audio(session, str(filepath or upload.filename), status="done", transcription=text,
+                                        content_hash=digest, model_version=version if digest else None,
+                                        **(draft_fields(text) if refine else {}))
+        if refine:
+            # Файл теперь у уточнения: оно и удалит его при нулевом сроке хранения
+            submit_refinement(job_id)
+        return Response(content={"id": job_id, "text": text, "status": "success", "filename": upload.filename})
+    except Exception as e:
+        print(f"❌ Ошибка потоковой загрузки: {e}")
+        if filepath is not None and UPLOAD_RETENTION_HOURS == 0:
+            filepath.unlink(missing_ok=True)
+        return Response(content={"text": "", "status": "error", "message": str(e)})
+    finally:
+        active_streams -= 1
+
+
+@post("/upload/events", request_max_body_size=UPLOAD_MAX_BYTES)
+async def upload_audio_events(request: Request[Any, Any, Any]) -> Response[Any]:
+    """Распознаёт файл, сообщая о ходе работы событиями SSE.
+
+    События: progress (процент прочитанного звука), segment (фраза Vosk),
+    sentence (предложение с пунктуацией), done (весь текст и id записи),
+    error. После done или error соединение закрывается.
+    """
+    global active_streams
+    if (error := models_not_ready()) is not None:
+        return Response(content=error)
+    if active_streams >= STREAM_MAX_ACTIVE:
+        return too_busy(STREAM_RETRY_AFTER, "Слишком много потоковых загрузок")
+    active_streams += 1
+    try:
+        upload = await open_upload(request)
+        filepath = new_upload_path(upload.filename)
+        await save_upload(upload, filepath)
+        digest = await audio_digest(filepath)
+        cached = await transcript_cache.get(digest) if digest else None
+    except Exception as e:
+        active_streams -= 1
+        print(f"❌ Ошибка загрузки: {e}")
+        return Response(content={"status": "error", "message": str(e)})
+    # Дальше слот держит сам поток событий и освобождает его, когда закончит
+    return ServerSentEvent(transcription_events(upload.filename, filepath, digest, cached))
+
 
+def sse_message(event: str, data: Dict[str, Any]) -> ServerSentEventMessage:
+    return ServerSentEventMessage(data=json.dumps(data, ensure_ascii=False), event=event)
 
-def mic_worker(samplerate: int, device: int, callback):
-    global stop_mic
-    rec = KaldiRecognizer(vosk_model, samplerate)
 
-    def sd_callback(indata, frames, time, status):
-        if status: print("⚠", status)
-        q.put(bytes(indata))
+async def transcription_events(filename: str, filepath: Path, digest: Optional[str],
+                               cached: Optional[str]) -> AsyncIterator[ServerSentEventMessage]:
+    global active_streams
+    keep = cached is None and UPLOAD_RETENTION_HOURS != 0
+    refine = TIERED and cached is None
+    refining = False
+    try:
+        text = cached
+        if text is None:
+            async for event, data in pipeline.stream(filepath):
+                if event == "done":
+                    text = data["text"]
+                else:
+                    yield sse_message(event, data)
+            if text is None:
+                raise RuntimeError("Распознавание закончилось без итогового текста")
+        version = transcript_cache.model_version if cached is not None else registry.model_version
+        async with async_session() as session:
+            job_id = await create_audio(session, str(filepath) if keep or refine else filename, status="done",
+                                        transcription=text, content_hash=digest,
+                                        model_version=version if digest else None,
+                                        **(draft_fields(text) if refine else {}))
+        if refine:
+            submit_refinement(job_id)
+            refining = True
+        if digest and cached is None and not TIERED:
+            transcript_cache.put(digest, text)
+        yield sse_message("done", {"id": job_id, "text": text, "cached": cached is not None, "filename": filename})
+    except Exception as e:
+        print(f"❌ Ошибка распознавания {filepath}: {e}")
+        yield sse_message("error", {"message": str(e)})
+    finally:
+        active_streams -= 1
+        # Файл, отданный уточнению, удалит оно
+        if not keep and not refining:
+            filepath.unlink(missing_ok=True)
+
+
+@post("/jobs/batch")
+async def submit_batch(data: BatchSubmitSchema, db_session: AsyncSession) -> Response[Any]:
+    """Ставит в очередь пачку http(s)-ссылок на аудио одним INSERT."""
+    if len(data.urls) > BATCH_MAX_URLS:
+        return Response(content={"error": f"Не больше {BATCH_MAX_URLS} URL за запрос"}, status_code=400)
+    invalid = [url for url in data.urls if not is_remote(url)]
+    if invalid:
+        return Response(content={"error": "Ожидались http(s)-ссылки", "invalid": invalid[:10]}, status_code=400)
+    try:
+        scheduler.check(jobs=len(data.urls))
+    except SchedulerFull as e:
+        return too_busy(e.retry_after, str(e))
+    ids = await create_audio_batch(db_session, data.urls)
+    for job_id in ids:
+        job_queue.submit(job_id, force=True)
+    return Response(content={"ids": ids, "status": "queued", "count": len(ids)}, status_code=201)
 
-    with sd.RawInputStream(samplerate=samplerate, blocksize=16000, device=device,
-                           dtype="int16", channels=1, callback=sd_callback):
-        while not stop_mic:
-            try:
-                data = q.get(timeout=0.1)
-                if rec.AcceptWaveform(data):
-                    result = json.loads(rec.Result())
-                    if result.get("text"):
-                        restored = restore_punctuation(result["text"])
-                        callback(restored)
-            except queue.Empty:
-                continue
 
+@get("/jobs/{job_id:int}")
+async def get_job(job_id: int, db_session: AsyncSession) -> Response[Any]:
+    content = await get_audio_json(db_session, job_id)
+    return Response(content=content, media_type="application/json")
 
-@post("/start_mic")
-async def start_mic() -> Dict[str, Any]:
-    global stop_mic
+
+@get("/jobs")
+async def list_jobs(db_session: AsyncSession, status: Optional[str] = None, cursor: Optional[str] = None,
+                    limit: int = 50) -> Response[Any]:
+    """Задачи от новых к старым без текста (он в /jobs/{id}); next_cursor передаётся в cursor следующей страницы."""
     try:
-        stop_mic = False
-        mic_results.clear()
+        content = await list_audio_json(db_session, status, cursor, max(1, min(limit, PAGE_LIMIT_MAX)))
+    except ValueError as e:
+        return Response(content={"error": str(e)}, status_code=400)
+    return Response(content=content, media_type="application/json")
 
-        devices = sd.query_devices()
-        input_device = next((i for i, d in enumerate(devices) if d["max_input_channels"] > 0), None)
-        if input_device is None:
-            return {"status": "error", "message": "Нет доступных микрофонов"}
 
-        samplerate = int(sd.query_devices(input_device, "input")["default_samplerate"])
-        print(f"🎤 Микрофон запущен: устройство {input_device}, {samplerate}Hz")
+@get("/search")
+async def search_jobs(q: str, db_session: AsyncSession, cursor: Optional[str] = None, limit: int = 50) -> Response[Any]:
+    try:
+        content = await search_audio_json(db_session, q, cursor, max(1, min(limit, PAGE_LIMIT_MAX)))
+    except ValueError as e:
+        return Response(content={"error": str(e)}, status_code=400)
+    return Response(content=content, media_type="application/json")
+
+
+mic_sessions = MicSessionRegistry(MIC_MAX_SESSIONS)
+live_writer: GroupCommitWriter[Dict[str, Any]] = GroupCommitWriter(
+    save_segments, LIVE_WRITE_BATCH, LIVE_WRITE_DELAY_MS / 1000, name="live-writer"
+)
+
+
+def persist_segment(session_id: str, position: int, seq: int, text: str) -> None:
+    """Ставит фразу в очередь записи; вызывается из потоков сессий и не ждёт БД."""
+    try:
+        live_writer.submit_threadsafe({"session_id": session_id, "position": position, "seq": seq, "text": text})
+    except RuntimeError as e:
+        print(f"⚠ Фраза {session_id[:8]}#{position} не сохранена: {e}")
+
 
-        def send_update(text):
-            mic_results.append(text)
-            print(f"🎤 {text}")
+def new_live_punctuator() -> punctuation.IncrementalPunctuator:
+    return punctuation.IncrementalPunctuator(LIVE_CONTEXT_WORDS, LIVE_REVISE_WORDS)
 
-        threading.Thread(target=mic_worker, args=(samplerate, input_device, send_update), daemon=True).start()
-        return {"status": "mic started", "device": input_device, "samplerate": samplerate}
+
+@post("/start_mic")
+async def start_mic(device: Optional[int] = None) -> Dict[str, Any]:
+    if (error := models_not_ready()) is not None:
+        return error
+    try:
+        if device is None:
+            devices = sd.query_devices()
+            device = next((i for i, d in enumerate(devices) if d["max_input_channels"] > 0), None)
+        if device is None:
+            return {"status": "error", "message": "Нет доступных микрофонов"}
+
+        samplerate = int(sd.query_devices(device, "input")["default_samplerate"])
+        session = MicSession(registry.vosk_model, samplerate, device, punct_batcher.predict_labels, new_live_punctuator(),
+                             blocksize=MIC_BLOCKSIZE, buffer_blocks=MIC_BUFFER_BLOCKS, sink=persist_segment)
+        mic_sessions.add(session)
+        session.start()
+        print(f"🎤 Микрофон запущен: сессия {session.id}, устройство {device}, {samplerate}Hz")
+        return {"status": "mic started", "session_id": session.id, "device": device, "samplerate": samplerate}
     except Exception as e:
         print(f"❌ Ошибка запуска микрофона: {e}")
         return {"status": "error", "message": str(e)}
 
 
 @post("/stop_mic")
-async def stop_mic_recording() -> Dict[str, Any]:
-    global stop_mic
-    stop_mic = True
-    print("🛑 Микрофон остановлен")
-    return {"status": "mic stopped"}
+async def stop_mic_recording(session_id: Optional[str] = None) -> Dict[str, Any]:
+    session = mic_sessions.get(session_id)
+    if session is None:
+        return {"status": "error", "message": "Сессия не найдена"}
+    session.stop()
+    print(f"🛑 Микрофон остановлен: сессия {session.id}")
+    return {"status": "mic stopped", "session_id": session.id}
 
 
 @get("/get_mic")
-async def get_mic() -> Dict[str, Any]:
-    full_text = " ".join(mic_results)
-    return {"text": full_text, "segments": len(mic_results)}
+async def get_mic(db_session: AsyncSession, session_id: Optional[str] = None, since: int = 0) -> Dict[str, Any]:
+    """Фразы сессии, появившиеся после курсора since; next — курсор для следующего опроса.
+
+    Сессии другого воркера или до перезапуска читаются из live_segments.
+    """
+    session = mic_sessions.get(session_id)
+    if session is None and session_id:
+        page = await get_segments(db_session, session_id, since, PAGE_LIMIT_MAX)
+        if page.segments or since:
+            return {
+                "session_id": session_id,
+                "segments": page.segments,
+                "text": " ".join(seg.text for seg in page.segments),
+                "next": page.next,
+                "active": False,
+            }
+    if session is None:
+        return {"status": "error", "message": "Сессия не найдена"}
+    segments, cursor = session.results.since(since)
+    return {
+        "session_id": session.id,
+        "segments": segments,
+        "text": " ".join(seg["text"] for seg in segments),
+        "next": cursor,
+        "active": session.active,
+        "dropped_blocks": session.audio.dropped,
+    }
+
+
+@websocket("/ws/mic")
+async def mic_socket(socket: WebSocket[Any, Any, Any], samplerate: int = 16000) -> None:
+    """Живое распознавание: PCM-кадры из браузера, в ответ частичные и финальные фразы."""
+    if (error := models_not_ready()) is not None:
+        await socket.accept()
+        await socket.send_json({"type": "error", **error})
+        await socket.close()
+        return
+    await run_live_socket(socket, registry.vosk_model, punct_batcher.predict_labels_async, new_live_punctuator(),
+                          samplerate, WS_BLOCK_MS, sink=persist_segment)
+
+
+@get("/sessions/{session_id:str}/segments")
+async def session_segments(session_id: str, db_session: AsyncSession, after: int = 0, limit: int = 500) -> Response[Any]:
+    """Сохранённые фразы живой сессии после курсора after (seq), в порядке изменений."""
+    content = await get_segments_json(db_session, session_id, after, max(1, min(limit, PAGE_LIMIT_MAX)))
+    return Response(content=content, media_type="application/json")
 
 
 @get("/health")
-async def health_check() -> Dict[str, Any]:
-    return {
-        "status": "healthy",
+async def health_check() -> Response[Any]:
+    # 503, пока модели не загружены: балансировщик не шлёт трафик в неготовый воркер
+    return Response(content={
+        "status": "healthy" if registry.ready else registry.state,
+        "pid": os.getpid(),
+        "models": registry.status(),
         "timestamp": datetime.now().isoformat(),
-        "mic_active": not stop_mic,
-        "mic_segments": len(mic_results)
-    }
+        "mic_sessions": mic_sessions.active_count(),
+        "jobs_queued": job_queue.depth,
+        "jobs_backlog_seconds": scheduler.backlog_seconds,
+        "refine_queued": refine_queue.depth if TIERED else None,
+        "db_writes_pending": status_writer.pending,
+        "live_writes_pending": live_writer.pending,
+        "db_avg_batch": status_writer.items / status_writer.transactions if status_writer.transactions else 0,
+        "asr_inflight": asr_executor.active if asr_executor else 0,
+        "refine_inflight": refine_executor.active if refine_executor else 0,
+        "punct_pending": punct_batcher.pending,
+        "punct_avg_batch": punct_batcher.requests / punct_batcher.batches if punct_batcher.batches else 0,
+        "transcript_cache": transcript_cache.stats(),
+        "downloads": {"done": downloader.downloads, "retried": downloader.retried, "failed": downloader.failed},
+    }, status_code=200 if registry.ready else 503)
+
+
+# -------------------- МЕТРИКИ --------------------
+REGISTRY.gauge("tt_jobs_queued", "Задачи в очереди транскрипции", lambda: job_queue.depth)
+REGISTRY.gauge("tt_jobs_backlog_seconds", "Суммарная длительность аудио в очереди", lambda: scheduler.backlog_seconds)
+REGISTRY.gauge("tt_jobs_rtf_estimate", "Текущая оценка RTF для Retry-After", lambda: scheduler.rtf)
+REGISTRY.counter("tt_jobs_rejected_total", "Задачи, отклонённые с 429", lambda: scheduler.rejected)
+REGISTRY.gauge("tt_upload_streams_active", "Активные /upload/stream и /upload/events", lambda: active_streams)
+REGISTRY.gauge("tt_asr_inflight", "Файлы в пуле Vosk", lambda: asr_executor.active if asr_executor else 0)
+REGISTRY.gauge("tt_refine_queued", "Задачи в очереди уточнения", lambda: refine_queue.depth)
+REGISTRY.gauge("tt_refine_backlog_seconds", "Длительность аудио в очереди уточнения",
+               lambda: refine_scheduler.backlog_seconds)
+REGISTRY.gauge("tt_refine_inflight", "Файлы в пуле уточнения", lambda: refine_executor.active if refine_executor else 0)
+REGISTRY.gauge("tt_punct_pending", "Запросы в очереди батчера пунктуации", lambda: punct_batcher.pending)
+REGISTRY.counter("tt_punct_batches_total", "Батчи пунктуации", lambda: punct_batcher.batches)
+REGISTRY.gauge("tt_db_writes_pending", "Записи в очереди групповой фиксации", lambda: status_writer.pending)
+REGISTRY.gauge("tt_live_writes_pending", "Фразы живых сессий в очереди записи", lambda: live_writer.pending)
+REGISTRY.counter("tt_live_segments_written_total", "Записанные фразы живых сессий", lambda: live_writer.items)
+REGISTRY.gauge("tt_mic_sessions_active", "Активные сессии микрофона", lambda: mic_sessions.active_count())
+REGISTRY.counter("tt_transcript_cache_hits_total", "Попадания в кэш транскрипций",
+                 lambda: transcript_cache.memory_hits + transcript_cache.db_hits)
+REGISTRY.counter("tt_transcript_cache_misses_total", "Промахи кэша транскрипций", lambda: transcript_cache.misses)
+REGISTRY.counter("tt_downloads_total", "Скачанные по URL файлы", lambda: downloader.downloads)
+REGISTRY.gauge("tt_models_ready", "Модели загружены", lambda: 1 if registry.ready else 0)
+
+
+@get("/metrics")
+async def metrics() -> Response[Any]:
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+background_tasks: List["asyncio.Task[None]"] = []
+
+
+async def start_models() -> None:
+    await registry.load_async()
+    # Уточнение запускается только после загрузки моделей: пул не форкается посреди неё,
+    # а восстановленные задачи не ждут модель в каждом воркере одновременно с родителем
+    if not TIERED or not registry.ready:
+        return
+    if refine_executor is not None:
+        refine_executor.start()
+    await refine_queue.start()
+
+
+async def start_background() -> None:
+    background_tasks.append(asyncio.create_task(start_models()))
+    if asr_executor is not None:
+        asr_executor.start()
+    await downloader.start()
+    await status_writer.start()
+    await live_writer.start()
+    await job_queue.start()
+    if UPLOAD_RETENTION_HOURS > 0:
+        background_tasks.append(asyncio.create_task(run_upload_gc(UPLOAD_RETENTION_HOURS, UPLOAD_GC_INTERVAL)))
+
+
+async def stop_background() -> None:
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    mic_sessions.stop_all()
+    await job_queue.stop()
+    await refine_queue.stop()
+    await status_writer.stop()
+    await live_writer.stop()
+    await downloader.stop()
+    if asr_executor is not None:
+        asr_executor.stop()
+    if refine_executor is not None:
+        refine_executor.stop()
+    punct_batcher.stop()
 
 
 # -------------------- APP (Windows 2.18.0 FIX) --------------------
 app = Litestar(
     route_handlers=[
-        index, upload_audio, start_mic,
-        stop_mic_recording, get_mic, health_check
+        index, upload_audio, upload_audio_stream, upload_audio_events, get_job, submit_batch, list_jobs, search_jobs,
+        start_mic, stop_mic_recording, get_mic, mic_socket, session_segments, health_check, metrics
     ],
+    dependencies={"db_session": Provide(provide_session)},
+    middleware=[metrics_middleware],
+    on_startup=[start_background],
+    on_shutdown=[stop_background],
     debug=True
     # ✅ УБРАНЫ: title, version, openapi_url
 )
@@ -0,0 +1,32 @@
+"""audio content hash
+
+Revision ID: 3b7c2f9a1d04
+Revises: e91d93104480
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c2f9a1d04'
+down_revision: Union[str, Sequence[str], None] = 'e91d93104480'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('audio_files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('audio_files', sa.Column('model_version', sa.String(length=32), nullable=True))
+    op.create_index('ix_audio_files_content_hash_model_version', 'audio_files', ['content_hash', 'model_version'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audio_files_content_hash_model_version', table_name='audio_files')
+    op.drop_column('audio_files', 'model_version')
+    op.drop_column('audio_files', 'content_hash')
@@ -0,0 +1,37 @@
+"""live segments
+
+Revision ID: 5f0a9c3e7b21
+Revises: 8d41e6c0b2f7
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0a9c3e7b21'
+down_revision: Union[str, Sequence[str], None] = '8d41e6c0b2f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('live_segments',
+    sa.Column('session_id', sa.String(length=32), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('session_id', 'position')
+    )
+    op.create_index('ix_live_segments_session_id_seq', 'live_segments', ['session_id', 'seq'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_live_segments_session_id_seq', table_name='live_segments')
+    op.drop_table('live_segments')
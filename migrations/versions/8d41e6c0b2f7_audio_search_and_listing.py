@@ -0,0 +1,40 @@
+"""audio search and listing
+
+Revision ID: 8d41e6c0b2f7
+Revises: 3b7c2f9a1d04
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41e6c0b2f7'
+down_revision: Union[str, Sequence[str], None] = '3b7c2f9a1d04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('audio_files', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('audio_files', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('russian', coalesce(transcription, ''))", persisted=True), nullable=True,
+    ))
+    op.create_index('ix_audio_files_status', 'audio_files', ['status'])
+    op.create_index('ix_audio_files_created_at_id', 'audio_files', ['created_at', 'id'])
+    op.create_index('ix_audio_files_search_vector', 'audio_files', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audio_files_search_vector', table_name='audio_files')
+    op.drop_index('ix_audio_files_created_at_id', table_name='audio_files')
+    op.drop_index('ix_audio_files_status', table_name='audio_files')
+    op.drop_column('audio_files', 'search_vector')
+    op.drop_column('audio_files', 'created_at')
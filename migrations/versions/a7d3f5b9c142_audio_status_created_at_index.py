@@ -0,0 +1,29 @@
+"""audio status created_at index
+
+Revision ID: a7d3f5b9c142
+Revises: c4e8a2d6f013
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f5b9c142'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a2d6f013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_audio_files_status_created_at_id', 'audio_files', ['status', 'created_at', 'id'])
+    op.drop_index('ix_audio_files_status', table_name='audio_files')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_audio_files_status', 'audio_files', ['status'])
+    op.drop_index('ix_audio_files_status_created_at_id', table_name='audio_files')
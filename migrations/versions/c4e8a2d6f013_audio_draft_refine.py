@@ -0,0 +1,32 @@
+"""audio draft and refine
+
+Revision ID: c4e8a2d6f013
+Revises: 5f0a9c3e7b21
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2d6f013'
+down_revision: Union[str, Sequence[str], None] = '5f0a9c3e7b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('audio_files', sa.Column('draft_transcription', sa.Text(), nullable=True))
+    op.add_column('audio_files', sa.Column('draft_model_version', sa.String(length=32), nullable=True))
+    op.add_column('audio_files', sa.Column('refine_status', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('audio_files', 'refine_status')
+    op.drop_column('audio_files', 'draft_model_version')
+    op.drop_column('audio_files', 'draft_transcription')
@@ -0,0 +1,98 @@
+"""Выигрыш аудио-фронтенда на 48 кГц стерео.
+
+Сравнивает три способа скормить файл Vosk:
+  * как было: перемежающиеся стерео-блоки на 48 кГц (неверный звук, двойная работа);
+  * моно 48 кГц: каналы сведены, частоту понижает сам Kaldi;
+  * фронтенд: моно 16 кГц после полифазного ресемплера (decode_file).
+Плюс отдельно стоимость самого фронтенда. Без модели Vosk замеряется только он.
+
+Запуск: python -m tests.frontend_benchmark [файл.wav] [секунд синтетики]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+import soundfile as sf
+
+from app.asr import CHUNK_SAMPLES, decode_file
+from app.audio_frontend import AudioFrontend, downmix
+from tests.pipeline_benchmark import synth_speech
+from tests.segment_parallel_benchmark import word_error_rate
+
+MODEL_PATH = "models/vosk-model-small-ru-0.22"
+SAMPLERATE = 48000
+
+
+def make_stereo(path: Path, seconds: float) -> None:
+    left = synth_speech(seconds, SAMPLERATE, seed=1)
+    right = synth_speech(seconds, SAMPLERATE, seed=2)
+    sf.write(path, np.stack([left, right], axis=1), SAMPLERATE, subtype="PCM_16")
+
+
+def decode_raw(model: object, filepath: Path, samplerate: int, convert: Callable[[np.ndarray], bytes]) -> str:
+    from vosk import KaldiRecognizer
+
+    rec = KaldiRecognizer(model, samplerate)
+    result = []
+    with sf.SoundFile(filepath) as f:
+        for block in f.blocks(blocksize=CHUNK_SAMPLES, dtype="int16", always_2d=True):
+            if rec.AcceptWaveform(convert(block)):
+                result.append(json.loads(rec.Result()).get("text", ""))
+    result.append(json.loads(rec.FinalResult()).get("text", ""))
+    return " ".join(t for t in result if t)
+
+
+def frontend_only(filepath: Path) -> float:
+    t0 = time.perf_counter()
+    with sf.SoundFile(filepath) as f:
+        frontend = AudioFrontend(f.samplerate, f.channels)
+        for block in f.blocks(blocksize=CHUNK_SAMPLES, dtype="int16", always_2d=True):
+            frontend.process(block)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    seconds = float(args[1]) if len(args) > 1 else 120.0
+    if args and args[0] != "-":
+        filepath = Path(args[0])
+    else:
+        filepath = Path("frontend_benchmark.wav")
+        make_stereo(filepath, seconds)
+    info = sf.info(str(filepath))
+    duration = info.duration
+    print(f"{filepath}: {duration:.0f} с, {info.samplerate} Гц, каналов: {info.channels}")
+
+    elapsed = frontend_only(filepath)
+    print(f"только чтение + фронтенд: {elapsed:.2f} с (RTF {elapsed / duration:.4f})")
+
+    if not Path(MODEL_PATH).is_dir():
+        print(f"Нет модели {MODEL_PATH} — распознавание не замеряется")
+        return
+    from vosk import Model
+    model = Model(MODEL_PATH)
+
+    runs: Dict[str, Callable[[], str]] = {
+        "как было (стерео 48 кГц)": lambda: decode_raw(model, filepath, info.samplerate, lambda b: b.tobytes()),
+        "моно, частота исходная": lambda: decode_raw(
+            model, filepath, info.samplerate, lambda b: downmix(b).astype(np.int16).tobytes()),
+        "фронтенд (моно 16 кГц)": lambda: decode_file(model, filepath, use_vad=False),
+    }
+    texts = {}
+    times = {}
+    for name, run in runs.items():
+        t0 = time.perf_counter()
+        texts[name] = run()
+        times[name] = time.perf_counter() - t0
+    reference = texts["фронтенд (моно 16 кГц)"]
+    baseline = times["как было (стерео 48 кГц)"]
+    for name in runs:
+        print(f"{name:<26} {times[name]:7.2f} с  RTF {times[name] / duration:.3f}  "
+              f"ускорение x{baseline / times[name]:.2f}  WER к фронтенду {word_error_rate(reference, texts[name]):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Пропускная способность скачивания по URL на локальном HTTP-сервере.
+
+Поднимает aiohttp-сервер, отдающий синтетические WAV (каждый N-й запрос
+сначала отвечает 503, чтобы проверить повторы), и прогоняет через
+Downloader пачку ссылок. Без моделей только скачивает и разбирает WAV,
+с моделью Vosk (--decode) ещё и распознаёт.
+
+Запуск: python -m tests.ingest_benchmark [файлов] [секунд в файле] [--decode]
+"""
+import asyncio
+import io
+import math
+import struct
+import sys
+import time
+import wave
+from typing import Dict
+
+from aiohttp import web
+
+from app.ingest import Downloader
+from app.streaming import WavStreamParser
+
+MODEL_PATH = "models/vosk-model-small-ru-0.22"
+HOST, PORT = "127.0.0.1", 8765
+CONCURRENCY = 32
+FAIL_EVERY = 10
+SERVER_CHUNK = 32 * 1024
+
+
+def make_wav(seconds: float, samplerate: int = 16000) -> bytes:
+    frames = int(seconds * samplerate)
+    samples = (int(3000 * math.sin(2 * math.pi * 440 * i / samplerate)) for i in range(frames))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(samplerate)
+        w.writeframes(struct.pack(f"<{frames}h", *samples))
+    return buf.getvalue()
+
+
+def make_app(body: bytes) -> web.Application:
+    attempts: Dict[str, int] = {}
+
+    async def audio(request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        attempts[name] = attempts.get(name, 0) + 1
+        if int(name) % FAIL_EVERY == 0 and attempts[name] == 1:
+            return web.Response(status=503)
+        response = web.StreamResponse(headers={"Content-Type": "audio/wav"})
+        response.content_length = len(body)
+        await response.prepare(request)
+        for i in range(0, len(body), SERVER_CHUNK):
+            await response.write(body[i:i + SERVER_CHUNK])
+        return response
+
+    app = web.Application()
+    app.router.add_get("/audio/{name}.wav", audio)
+    return app
+
+
+async def consume(downloader: Downloader, url: str) -> int:
+    parser = WavStreamParser()
+    pcm = 0
+    async for chunk in downloader.stream(url):
+        pcm += len(parser.feed(chunk))
+    return pcm
+
+
+async def run(files: int, seconds: float, decode: bool) -> None:
+    body = make_wav(seconds)
+    runner = web.AppRunner(make_app(body))
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+
+    downloader = Downloader(connections=CONCURRENCY, per_host=CONCURRENCY, backoff=0.05)
+    await downloader.start()
+    urls = [f"http://{HOST}:{PORT}/audio/{i}.wav" for i in range(files)]
+    slots = asyncio.Semaphore(CONCURRENCY)
+
+    if decode:
+        from vosk import Model
+
+        from app.uploads import decode_stream
+        model = Model(MODEL_PATH)
+
+        async def job(url: str) -> None:
+            async with slots:
+                await decode_stream(model, downloader.stream(url))
+    else:
+        async def job(url: str) -> None:
+            async with slots:
+                await consume(downloader, url)
+
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(job(url) for url in urls))
+    finally:
+        elapsed = time.perf_counter() - t0
+        await downloader.stop()
+        await runner.cleanup()
+
+    print(f"файлов: {downloader.downloads}/{files}, повторов: {downloader.retried}, ошибок: {downloader.failed}")
+    print(f"{elapsed:.2f} с, {files / elapsed * 60:.0f} файлов/мин, "
+          f"{downloader.bytes / elapsed / 1024 ** 2:.1f} МБ/с, "
+          f"{files * seconds / elapsed:.1f} с аудио в секунду")
+
+
+def main() -> None:
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    files = int(args[0]) if args else 500
+    seconds = float(args[1]) if len(args) > 1 else 10.0
+    asyncio.run(run(files, seconds, "--decode" in sys.argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,105 @@
-from app.schemas import AudioFileSchema
-import msgspec
+"""Сериализация msgspec против json и обращения к БД на одну задачу.
 
-audio = AudioFileSchema(id=1, url="https://example.com/audio.mp3")
+Вторая часть прогоняет jobs задач через жизненный цикл
+queued -> processing -> done двумя способами: построчными commit'ами
+(crud.apply_updates по одной строке) и через GroupCommitWriter. Считаются выражения SQL,
+COMMIT'ы и время. Нужна БД из .env.
 
-# сериализация в JSON (bytes)
-data = msgspec.json.encode(audio)
-print(data)
+Запуск: python -m tests.msgspec_productivity [задач] [параллельно]
+"""
+import asyncio
+import json, msgspec, sys, time
+from typing import Any, Dict
 
-# десериализация обратно
-decoded = msgspec.json.decode(data, type=AudioFileSchema)
-print(decoded)
+from sqlalchemy import delete, event
 
-import json, msgspec, time
+from app.crud import audio as audio_crud
+from app.database import async_session, engine
+from app.group_commit import GroupCommitWriter
+from app.models import AudioFile
 from app.schemas import AudioFileSchema
 
-data = {"id": 1, "url": "a.mp3", "status": "queued", "transcription": None}
+data: Dict[str, Any] = {"id": 1, "url": "a.mp3", "status": "queued", "transcription": None}
+
+
+def encode_benchmark() -> None:
+    # JSON stdlib
+    t0 = time.perf_counter()
+    for _ in range(100_000):
+        json.dumps(data)
+    print("stdlib:", time.perf_counter() - t0)
+
+    # msgspec
+    struct = AudioFileSchema(**data)
+    t1 = time.perf_counter()
+    for _ in range(100_000):
+        msgspec.json.encode(struct)
+    print("msgspec:", time.perf_counter() - t1)
+
+
+class RoundTrips:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args: Any) -> None:
+        self.statements += 1
+
+    def _on_commit(self, *args: Any) -> None:
+        self.commits += 1
+
+    def reset(self) -> None:
+        self.statements = self.commits = 0
+
+
+async def run_jobs(jobs: int, parallel: int, writer: "GroupCommitWriter[Dict[str, Any]] | None") -> None:
+    async with async_session() as session:
+        ids = await audio_crud.create_audio_batch(session, [f"bench/{i}.wav" for i in range(jobs)])
+    slots = asyncio.Semaphore(parallel)
+
+    async def job(job_id: int) -> None:
+        async with slots:
+            for status, text in (("processing", None), ("done", "текст")):
+                values: Dict[str, Any] = {"id": job_id, "status": status}
+                if text is not None:
+                    values["transcription"] = text
+                if writer is None:
+                    async with async_session() as session:
+                        await audio_crud.apply_updates(session, [values])
+                else:
+                    await writer.write(values)
+
+    await asyncio.gather(*(job(i) for i in ids))
+
+
+async def db_benchmark(jobs: int, parallel: int) -> None:
+    counter = RoundTrips()
+    writer: GroupCommitWriter[Dict[str, Any]] = GroupCommitWriter(audio_crud.apply_updates)
+    await writer.start()
+    try:
+        for name, w in (("построчно", None), ("group commit", writer)):
+            counter.reset()
+            t0 = time.perf_counter()
+            await run_jobs(jobs, parallel, w)
+            elapsed = time.perf_counter() - t0
+            print(f"{name:<13} {elapsed:6.2f} с  выражений на задачу {counter.statements / jobs:5.2f}  "
+                  f"COMMIT на задачу {counter.commits / jobs:5.2f}  задач/с {jobs / elapsed:7.0f}")
+    finally:
+        await writer.stop()
+        async with async_session() as session:
+            await session.execute(delete(AudioFile).where(AudioFile.url.like("bench/%")))
+            await session.commit()
+        await engine.dispose()
+
+
+def main() -> None:
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    parallel = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    encode_benchmark()
+    asyncio.run(db_benchmark(jobs, parallel))
 
-# JSON stdlib
-t0 = time.perf_counter()
-for _ in range(100_000):
-    json.dumps(data)
-print("stdlib:", time.perf_counter() - t0)
 
-# msgspec
-struct = AudioFileSchema(**data)
-t1 = time.perf_counter()
-for _ in range(100_000):
-    msgspec.json.encode(struct)
-print("msgspec:", time.perf_counter() - t1)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Воспроизводимый бенчмарк всего конвейера транскрипции без сети.
+
+Замеряет:
+  * RTF transcribe_file на синтетических WAV разной длины и частоты;
+  * токены/с restore_punctuation на текстах разной длины;
+  * время до первых событий Pipeline.stream (прогресс, фраза,
+    предложение) на самой длинной записи против полного распознавания;
+  * задержку POST /upload и готовности задачи (p50/p95/p99) под
+    параллельной нагрузкой, плюс ответ на дубликат из кэша;
+  * пиковый RSS процесса.
+
+Если в models/ лежат Vosk и RUPunct, используются они, иначе (или с
+--stub) — заглушки из tests/stub_models.py. Замер /upload нужен PostgreSQL
+из .env, без него раздел помечается как пропущенный. Результат пишется в
+JSON; --compare старый.json печатает изменения относительно прошлого
+прогона.
+
+Запуск: python -m tests.pipeline_benchmark [--out файл.json] [--compare файл.json]
+        [--stub] [--uploads N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Распознавание в основном процессе: заглушки не переживают spawn, а замеры стабильнее
+os.environ.setdefault("ASR_PROCESSES", "0")
+os.environ.setdefault("UPLOAD_RETENTION_HOURS", "0")
+
+import numpy as np
+import soundfile as sf
+
+DURATIONS = (5.0, 30.0, 120.0)
+SAMPLERATES = (8000, 16000, 44100)
+TEXT_WORDS = (16, 128, 1024, 4096)
+SEED = 1234
+WORDS = ("добрый день меня зовут анна чем могу помочь я звоню по поводу заказа который должен был "
+         "прийти вчера но курьер так и не приехал подскажите пожалуйста что случилось").split()
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def synth_speech(seconds: float, samplerate: int, seed: int = SEED) -> np.ndarray:
+    """Шум с формантами и слоговой огибающей: похоже на речь по спектру и паузам."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    voice = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, np.pi)) / (i + 1)
+                for i, f in enumerate((140.0, 520.0, 1250.0, 2400.0)) if f < samplerate / 2)
+    envelope = np.clip(np.sin(2 * np.pi * 3.5 * t), 0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.3)
+    signal = 0.3 * voice * envelope + 0.01 * rng.standard_normal(len(t))
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def make_fixtures(directory: Path) -> List[Dict[str, Any]]:
+    fixtures = []
+    for seconds in DURATIONS:
+        for samplerate in SAMPLERATES:
+            path = directory / f"synth_{int(seconds)}s_{samplerate}.wav"
+            sf.write(path, synth_speech(seconds, samplerate), samplerate, subtype="PCM_16")
+            fixtures.append({"path": path, "seconds": seconds, "samplerate": samplerate})
+    return fixtures
+
+
+def bench_transcribe(main: Any, fixtures: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results = []
+    for fx in fixtures:
+        t0 = time.perf_counter()
+        text = main.pipeline.transcribe_file(fx["path"])
+        elapsed = time.perf_counter() - t0
+        results.append({
+            "seconds": fx["seconds"],
+            "samplerate": fx["samplerate"],
+            "elapsed_s": elapsed,
+            "rtf": elapsed / fx["seconds"],
+            "words": len(text.split()),
+        })
+        print(f"transcribe_file {fx['seconds']:5.0f} с @ {fx['samplerate']:5d} Гц: RTF {elapsed / fx['seconds']:.4f}")
+    return results
+
+
+async def bench_stream(main: Any, fixtures: List[Dict[str, Any]]) -> Dict[str, Any]:
+    fx = max((f for f in fixtures if f["samplerate"] == 16000), key=lambda f: f["seconds"])
+    first: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    async for event, _ in main.pipeline.stream(fx["path"]):
+        first.setdefault(event, time.perf_counter() - t0)
+    result = {"seconds": fx["seconds"], **{f"first_{event}_s": elapsed for event, elapsed in first.items()}}
+    print(f"stream {fx['seconds']:.0f} с: " + ", ".join(f"{event} через {elapsed:.2f} с" for event, elapsed in first.items()))
+    return result
+
+
+def bench_punctuation(main: Any, registry: Any) -> List[Dict[str, Any]]:
+    results = []
+    tokenizer = registry.classifier.tokenizer
+    main.pipeline.restore_punctuation(" ".join(WORDS[:8]))  # прогрев
+    for count in TEXT_WORDS:
+        words = [WORDS[i % len(WORDS)] for i in range(count)]
+        tokens = sum(len(ids) for ids in tokenizer(words, add_special_tokens=False)["input_ids"])
+        text = " ".join(words)
+        t0 = time.perf_counter()
+        main.pipeline.restore_punctuation(text)
+        elapsed = time.perf_counter() - t0
+        results.append({"words": count, "tokens": tokens, "elapsed_s": elapsed, "tokens_per_s": tokens / elapsed})
+        print(f"restore_punctuation {count:5d} слов: {tokens / elapsed:10.0f} токенов/с")
+    return results
+
+
+async def db_available() -> Optional[str]:
+    from sqlalchemy import text
+
+    from app.database import engine
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return None
+    except Exception as e:
+        return f"БД недоступна: {e}"
+
+
+async def bench_upload(main: Any, uploads: int, concurrency: int, seconds: float = 5.0) -> Dict[str, Any]:
+    from litestar.testing import AsyncTestClient
+
+    samples = synth_speech(seconds, 16000)
+    submit: List[float] = []
+    done: List[float] = []
+    failed = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    def wav_bytes(n: int) -> bytes:
+        # Каждая загрузка уникальна, иначе замер попадёт в кэш транскрипций
+        data = samples.copy()
+        data[:8] = np.frombuffer(n.to_bytes(16, "little"), dtype=np.int16)
+        with tempfile.SpooledTemporaryFile() as f:
+            sf.write(f, data, 16000, format="WAV", subtype="PCM_16")
+            f.seek(0)
+            return f.read()
+
+    async with AsyncTestClient(app=main.app, timeout=300) as client:
+        async def upload(body: bytes) -> Optional[Dict[str, Any]]:
+            t0 = time.perf_counter()
+            response = await client.post("/upload", files={"file": ("bench.wav", body, "audio/wav")})
+            submit.append(time.perf_counter() - t0)
+            job: Dict[str, Any] = response.json()
+            if "id" not in job:
+                return None
+            while job.get("status") not in ("done", "error"):
+                await asyncio.sleep(0.02)
+                job = (await client.get(f"/jobs/{job['id']}")).json()
+            done.append(time.perf_counter() - t0)
+            return job
+
+        async def one(n: int) -> None:
+            nonlocal failed
+            async with slots:
+                job = await upload(wav_bytes(n))
+                if job is None or job["status"] != "done":
+                    failed += 1
+
+        seed = int(time.time())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(seed + n) for n in range(uploads)))
+        wall = time.perf_counter() - t0
+
+        duplicate = wav_bytes(seed)
+        t1 = time.perf_counter()
+        cached = await upload(duplicate)
+        cached_ms = (time.perf_counter() - t1) * 1000
+
+    def summary(values: List[float]) -> Dict[str, float]:
+        ms = [v * 1000 for v in values] or [0.0]
+        return {"p50_ms": percentile(ms, 0.5), "p95_ms": percentile(ms, 0.95),
+                "p99_ms": percentile(ms, 0.99), "mean_ms": statistics.fmean(ms)}
+
+    result: Dict[str, Any] = {
+        "uploads": uploads,
+        "concurrency": concurrency,
+        "audio_seconds": seconds,
+        "failed": failed,
+        "throughput_per_s": uploads / wall,
+        "submit": summary(submit),
+        "done": summary(done),
+        "duplicate_ms": cached_ms,
+        "duplicate_cached": bool(cached and cached.get("cached")),
+    }
+    print(f"/upload x{uploads} ({concurrency} параллельно): ответ p95 {result['submit']['p95_ms']:.0f} мс, "
+          f"готово p95 {result['done']['p95_ms']:.0f} мс, дубликат {cached_ms:.0f} мс")
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Печатает изменения ключевых метрик: >1 — стало медленнее (для токенов/с — быстрее)."""
+    print(f"\nСравнение с {previous.get('commit')} ({previous.get('models')}):")
+    for now, before in zip(current["transcribe"], previous.get("transcribe", [])):
+        print(f"  RTF {now['seconds']:.0f} с @ {now['samplerate']} Гц: x{now['rtf'] / before['rtf']:.2f}")
+    for now, before in zip(current["punctuation"], previous.get("punctuation", [])):
+        print(f"  токенов/с {now['words']} слов: x{now['tokens_per_s'] / before['tokens_per_s']:.2f}")
+    if "first_segment_s" in current["stream"] and "first_segment_s" in previous.get("stream", {}):
+        print(f"  первая фраза stream: x{current['stream']['first_segment_s'] / previous['stream']['first_segment_s']:.2f}")
+    if "done" in current["upload"] and "done" in previous.get("upload", {}):
+        print(f"  /upload готово p95: x{current['upload']['done']['p95_ms'] / previous['upload']['done']['p95_ms']:.2f}")
+    print(f"  пиковый RSS: x{current['peak_rss_mb'] / previous['peak_rss_mb']:.2f}")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.registry import registry
+
+    use_stub = args.stub or not (Path(registry.vosk_path).is_dir() and Path(registry.punct_path).is_dir())
+    if use_stub:
+        from tests import stub_models
+        stub_models.install(registry)
+    import main
+
+    t0 = time.perf_counter()
+    await asyncio.to_thread(registry.load)
+    load_s = time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = make_fixtures(Path(tmp))
+        transcribe = await asyncio.to_thread(bench_transcribe, main, fixtures)
+        stream = await bench_stream(main, fixtures)
+    punct = await asyncio.to_thread(bench_punctuation, main, registry)
+
+    skipped = await db_available()
+    if skipped is None:
+        upload = await bench_upload(main, args.uploads, args.concurrency)
+    else:
+        print(f"/upload пропущен: {skipped}")
+        upload = {"skipped": skipped}
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "models": "stub" if use_stub else "real",
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "model_load_s": load_s,
+        "transcribe": transcribe,
+        "punctuation": punct,
+        "stream": stream,
+        "upload": upload,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="pipeline_benchmark.json")
+    parser.add_argument("--compare")
+    parser.add_argument("--stub", action="store_true", help="заглушки даже при наличии models/")
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nпиковый RSS {result['peak_rss_mb']:.0f} МБ, результат: {args.out}")
+    if args.compare:
+        compare(result, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Сравнение бэкендов пунктуации fp32 и int8 на фиксированном корпусе.
+
+Для каждого бэкенда: задержка на одну фразу (p50/p95), пропускная способность
+на всём корпусе, память процесса (VmRSS после загрузки модели и пик VmHWM)
+и совпадение меток с fp32. Каждый бэкенд работает в отдельном процессе:
+в общем процессе освобождённая память fp32 переиспользуется и цифры int8
+ничего не значат.
+
+Запуск: python -m tests.punctuation_backends [потоков]
+"""
+import multiprocessing
+import statistics
+import sys
+import time
+from typing import Any, Dict
+
+from app import punctuation
+
+PUNCT_MODEL_PATH = "models/RUPunct_big"
+
+CORPUS = [
+    "добрый день меня зовут анна чем могу помочь",
+    "я звоню по поводу заказа который должен был прийти вчера но курьер так и не приехал",
+    "подскажите пожалуйста что случилось и когда ждать доставку",
+    "да конечно сейчас посмотрю продиктуйте номер заказа",
+    "спасибо одну минуту я проверю информацию в системе",
+    "к сожалению посылка задержалась на складе из за погодных условий",
+    "ее доставят завтра в первой половине дня вас устроит такое время",
+    "а можно перенести доставку на вечер я работаю до шести",
+    "хорошо я оформлю перенос на вечер с восемнадцати до двадцати одного часа",
+    "скажите а стоимость доставки при этом изменится или останется прежней",
+    "нет стоимость останется прежней дополнительная плата не взимается",
+    "отлично тогда все понятно спасибо вам большое за помощь",
+    "могу ли я еще чем нибудь помочь",
+    "нет больше ничего не нужно всего доброго до свидания",
+] * 4
+
+
+def memory_mb() -> Dict[str, float]:
+    """VmRSS (текущий) и VmHWM (пиковый) размер этого процесса из /proc."""
+    memory: Dict[str, float] = {}
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                memory[key] = int(value.split()[0]) / 1024
+    return memory
+
+
+def run_backend(backend: str, threads: int) -> Dict[str, Any]:
+    punctuation.configure_threads(threads or None)
+    before = memory_mb()["VmRSS"]
+    classifier = punctuation.load_classifier(PUNCT_MODEL_PATH, backend)
+    loaded = memory_mb()["VmRSS"]
+    punctuation.restore_punctuation(classifier, CORPUS[0])  # прогрев
+
+    latencies = []
+    for text in CORPUS:
+        t0 = time.perf_counter()
+        punctuation.restore_punctuation(classifier, text)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    corpus_text = " ".join(CORPUS)
+    t0 = time.perf_counter()
+    labels = punctuation.predict_labels(classifier, corpus_text)
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    memory = memory_mb()
+    return {
+        "backend": backend,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "words_per_s": len(corpus_text.split()) / elapsed,
+        "rss_base_mb": before,
+        "rss_mb": loaded,
+        "hwm_mb": memory["VmHWM"],
+        "labels": labels,
+    }
+
+
+def main() -> None:
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+
+    # spawn: чистый процесс без унаследованных от родителя страниц модели
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for backend in punctuation.BACKENDS:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_backend, (backend, threads)))
+    reference = results[0]["labels"]
+    for r in results:
+        same = sum(a == b for a, b in zip(reference, r["labels"]))
+        agreement = same / max(len(reference), 1)
+        print(f"{r['backend']:<5} p50 {r['p50_ms']:6.1f} мс  p95 {r['p95_ms']:6.1f} мс  "
+              f"{r['words_per_s']:7.0f} слов/с  RSS {r['rss_mb']:6.0f} МБ (+{r['rss_mb'] - r['rss_base_mb']:.0f})  "
+              f"пик {r['hwm_mb']:6.0f} МБ  совпадение меток {agreement:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Скорость восстановления пунктуации: прежний поштучный проход против батчевого.
+
+Запуск: python -m tests.punctuation_benchmark [файл с сырым текстом] [число слов]
+"""
+import sys
+import time
+from typing import Any, Callable
+
+from transformers import AutoTokenizer, pipeline
+
+from app import punctuation
+
+PUNCT_MODEL_PATH = "models/RUPunct_big"
+
+SAMPLE = (
+    "добрый день меня зовут анна я звоню по поводу заказа который должен был прийти вчера "
+    "но курьер так и не приехал подскажите пожалуйста что случилось и когда ждать доставку "
+    "да конечно сейчас посмотрю номер заказа продиктуйте пожалуйста спасибо одну минуту"
+)
+
+
+def legacy_restore(classifier: Any, raw_text: str) -> str:
+    # Поведение до батчинга: по 200 слов, по одному вызову модели на кусок
+    words = raw_text.split()
+    output = ""
+    for i in range(0, len(words), 200):
+        for item in classifier(" ".join(words[i:i + 200])):
+            output += " " + punctuation.process_token(item["word"].strip(), item["entity_group"])
+    return output.strip()
+
+
+def measure(name: str, fn: Callable[..., Any], text: str, tokens: int) -> None:
+    fn(text[:2000])  # прогрев
+    t0 = time.perf_counter()
+    fn(text)
+    elapsed = time.perf_counter() - t0
+    print(f"{name:<28} {elapsed:7.2f} с  {tokens / elapsed:9.0f} токенов/с")
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            text = f.read()
+    else:
+        words = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+        base = SAMPLE.split()
+        text = " ".join(base[i % len(base)] for i in range(words))
+
+    tk = AutoTokenizer.from_pretrained(PUNCT_MODEL_PATH, strip_accents=False, add_prefix_space=True)
+    classifier = pipeline("ner", model=PUNCT_MODEL_PATH, tokenizer=tk, aggregation_strategy="first", device=-1)
+    tokens = sum(len(ids) for ids in tk(text.split(), add_special_tokens=False)["input_ids"])
+    print(f"слов: {len(text.split())}, токенов: {tokens}")
+
+    measure("поштучно (200 слов)", lambda t: legacy_restore(classifier, t), text, tokens)
+    for batch_size in (1, 8, 32):
+        measure(f"батч {batch_size}, окно {punctuation.MAX_TOKENS} ток.",
+                lambda t, bs=batch_size: punctuation.restore_punctuation(classifier, t, batch_size=bs), text, tokens)
+
+
+if __name__ == "__main__":
+    main()
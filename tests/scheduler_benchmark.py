@@ -0,0 +1,81 @@
+"""Задержка коротких записей в очереди с длинными: FIFO против «сначала короткие».
+
+Модель нагрузки: поток голосовых сообщений по 5–60 с, среди которых
+время от времени приходят многочасовые записи. Распознавание имитируется
+сном длительностью duration * RTF * SCALE, поэтому прогон занимает секунды.
+FIFO получается из того же JobScheduler с огромным старением: порядок тогда
+задаёт только время постановки. Старение задаётся в модельном времени и
+пересчитывается в реальное делением на SCALE.
+
+Запуск: python -m tests.scheduler_benchmark [задач] [воркеров]
+"""
+import asyncio
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from app.scheduler import JobScheduler
+from tests.pipeline_benchmark import percentile
+
+RTF = 0.3
+SCALE = 1 / 2000  # секунда аудио -> секунды сна
+LONG_SHARE = 0.03
+SEED = 1234
+
+
+def workload(jobs: int) -> List[Tuple[float, float]]:
+    """(пауза перед постановкой, длительность аудио) для каждой задачи."""
+    rng = random.Random(SEED)
+    result = []
+    for _ in range(jobs):
+        duration = rng.uniform(2 * 3600, 4 * 3600) if rng.random() < LONG_SHARE else rng.uniform(5, 60)
+        result.append((rng.expovariate(1 / 0.002), duration))
+    return result
+
+
+async def simulate(jobs: List[Tuple[float, float]], workers: int, aging: float) -> Dict[str, float]:
+    scheduler = JobScheduler(max_jobs=len(jobs), max_backlog_seconds=float("inf"), parallelism=workers, aging=aging)
+    submitted: Dict[int, float] = {}
+    latency: Dict[int, float] = {}
+    durations = {job_id: duration for job_id, (_, duration) in enumerate(jobs)}
+
+    async def worker() -> None:
+        while True:
+            job_id, _ = await scheduler.get()
+            await asyncio.sleep(durations[job_id] * RTF * SCALE)
+            latency[job_id] = time.perf_counter() - submitted[job_id]
+            scheduler.task_done()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    for job_id, (pause, duration) in enumerate(jobs):
+        await asyncio.sleep(pause)
+        submitted[job_id] = time.perf_counter()
+        scheduler.admit(job_id, duration)
+    await scheduler._queue.join()
+    for task in tasks:
+        task.cancel()
+
+    short = [latency[i] / SCALE for i, d in durations.items() if d < 3600]
+    long = [latency[i] / SCALE for i, d in durations.items() if d >= 3600]
+    return {
+        "short_p50": percentile(short, 0.5),
+        "short_p95": percentile(short, 0.95),
+        "long_p95": percentile(long, 0.95) if long else 0.0,
+        "long_max": max(long, default=0.0),
+    }
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    jobs = workload(count)
+    print(f"{count} задач, воркеров: {workers}; задержки в секундах модельного времени")
+    for name, aging in (("FIFO", 1e12), ("SJF, старение 10", 10.0), ("SJF без старения", 0.0)):
+        r = asyncio.run(simulate(jobs, workers, aging / SCALE))
+        print(f"{name:<18} короткие p50 {r['short_p50']:8.0f}  p95 {r['short_p95']:8.0f}   "
+              f"длинные p95 {r['long_p95']:8.0f}  max {r['long_max']:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Сравнение последовательного и оконного (параллельного) распознавания длинной записи.
+
+Запуск: python -m tests.segment_parallel_benchmark path/to/long.wav [процессов]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import soundfile as sf
+from vosk import Model
+
+from app.asr import SEGMENT_OVERLAP_SECONDS, SEGMENT_WINDOW_SECONDS, VoskExecutor, decode_file
+
+MODEL_PATH = "models/vosk-model-small-ru-0.22"
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref, hyp = reference.split(), hypothesis.split()
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / max(len(ref), 1)
+
+
+async def segmented(filepath: str, processes: int) -> str:
+    # Время обоих вариантов включает загрузку модели
+    executor = VoskExecutor(MODEL_PATH, processes)
+    executor.start()
+    try:
+        return await executor.decode_segmented(filepath, SEGMENT_WINDOW_SECONDS, SEGMENT_OVERLAP_SECONDS)
+    finally:
+        executor.stop()
+
+
+def main() -> None:
+    filepath = sys.argv[1]
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    print(f"длительность: {sf.info(filepath).duration:.0f} с")
+
+    t0 = time.perf_counter()
+    sequential = decode_file(Model(MODEL_PATH), filepath, use_vad=False)
+    seq_time = time.perf_counter() - t0
+    print(f"последовательное: {seq_time:.1f} с")
+
+    t0 = time.perf_counter()
+    parallel = asyncio.run(segmented(filepath, processes))
+    par_time = time.perf_counter() - t0
+    print(f"оконное ({processes} проц.): {par_time:.1f} с, ускорение x{seq_time / par_time:.1f}")
+    print(f"расхождение (WER относительно последовательного): {word_error_rate(sequential, parallel):.2%}")
+
+
+if __name__ == "__main__":
+    main()
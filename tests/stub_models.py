@@ -0,0 +1,118 @@
+"""Заглушки моделей Vosk и RUPunct для бенчмарков без моделей и сети.
+
+Поведение детерминированное и повторяет интерфейсы, которыми пользуется
+приложение: KaldiRecognizer (AcceptWaveform/Result/FinalResult/...) и
+NER-пайплайн transformers с токенизатором. Стоимость «инференса» почти
+нулевая, поэтому замеры со заглушками показывают накладные расходы самого
+конвейера: чтение звука, окна, батчинг, БД, HTTP.
+"""
+import json
+from typing import Any, Dict, List, Sequence, Union
+
+from app.registry import ModelRegistry
+
+# Одно «слово» на столько секунд звука, фраза закрывается раз в PHRASE_SECONDS
+WORD_SECONDS = 0.4
+PHRASE_SECONDS = 3.0
+
+
+class StubModel:
+    def __init__(self, path: str = "stub") -> None:
+        self.path = path
+
+
+class StubRecognizer:
+    def __init__(self, model: Any, samplerate: float, *args: Any) -> None:
+        self.samplerate = int(samplerate)
+        self.words = False
+        self.Reset()
+
+    def SetWords(self, enabled: bool) -> None:
+        self.words = enabled
+
+    def Reset(self) -> None:
+        self._samples = 0
+        self._phrase_start = 0
+        self._emitted = 0
+        self._ready: List[Dict[str, Any]] = []
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        step = int(WORD_SECONDS * self.samplerate)
+        words = []
+        while (self._emitted + 1) * step <= self._samples:
+            start = self._emitted * step / self.samplerate
+            words.append({"word": f"слово{self._emitted % 50}", "start": start,
+                          "end": start + WORD_SECONDS, "conf": 1.0})
+            self._emitted += 1
+        return words
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        self._samples += len(data) // 2
+        self._ready.extend(self._collect())
+        if self._samples - self._phrase_start >= PHRASE_SECONDS * self.samplerate:
+            self._phrase_start = self._samples
+            return True
+        return False
+
+    def _result(self, words: List[Dict[str, Any]]) -> str:
+        result: Dict[str, Any] = {"text": " ".join(w["word"] for w in words)}
+        if self.words:
+            result["result"] = words
+        return json.dumps(result, ensure_ascii=False)
+
+    def Result(self) -> str:
+        words, self._ready = self._ready, []
+        return self._result(words)
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": " ".join(w["word"] for w in self._ready)}, ensure_ascii=False)
+
+    def FinalResult(self) -> str:
+        words = self._ready + self._collect()
+        self._ready = []
+        return self._result(words)
+
+
+class StubTokenizer:
+    """Примерно один токен на четыре символа, как у subword-токенизаторов."""
+
+    def num_special_tokens_to_add(self) -> int:
+        return 2
+
+    def __call__(self, words: Sequence[str], add_special_tokens: bool = True) -> Dict[str, List[List[int]]]:
+        extra = 2 if add_special_tokens else 0
+        return {"input_ids": [[0] * (max(1, len(w) // 4) + extra) for w in words]}
+
+
+class StubClassifier:
+    """Каждое слово — отдельная группа; заглавная после точки, точка каждые 8 слов."""
+
+    def __init__(self) -> None:
+        self.tokenizer = StubTokenizer()
+
+    def _predict(self, text: str) -> List[Dict[str, Any]]:
+        groups = []
+        offset = 0
+        for i, word in enumerate(text.split(" ")):
+            case = "UPPER" if i % 8 == 0 else "LOWER"
+            punct = "PERIOD" if i % 8 == 7 else "O"
+            groups.append({"entity_group": f"{case}_{punct}", "word": word,
+                           "start": offset, "end": offset + len(word), "score": 1.0})
+            offset += len(word) + 1
+        return groups
+
+    def __call__(self, texts: Union[str, List[str]], batch_size: int = 1) -> Any:
+        if isinstance(texts, str):
+            return self._predict(texts)
+        return [self._predict(text) for text in texts]
+
+
+def install(registry: ModelRegistry) -> None:
+    """Подменяет модели реестра и конструктор распознавателя на заглушки."""
+    import app.asr
+    import app.registry
+
+    app.asr.KaldiRecognizer = StubRecognizer  # type: ignore[attr-defined]
+    app.registry.KaldiRecognizer = StubRecognizer  # type: ignore[attr-defined]
+    registry._vosk[registry.vosk_path] = StubModel(registry.vosk_path)
+    registry._classifier = StubClassifier()
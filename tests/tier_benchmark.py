@@ -0,0 +1,77 @@
+"""Двухуровневое распознавание: скорость черновика и уточнения на одной записи.
+
+Замеряются RTF обеих моделей Vosk по отдельности и черновика, пока в
+соседних процессах с пониженным приоритетом крутится уточнение (так
+/upload работает под фоновой нагрузкой), плюс расхождение текстов.
+
+Запуск: python -m tests.tier_benchmark файл.wav [модель уточнения] [процессов уточнения]
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Tuple
+
+import soundfile as sf
+
+from app.asr import VoskExecutor, decode_file
+from app.registry import MODEL_PATH
+from tests.segment_parallel_benchmark import word_error_rate
+
+REFINE_PATH = os.getenv("VOSK_REFINE_MODEL_PATH", "models/vosk-model-ru-0.42")
+REFINE_NICE = 10
+
+
+def rtf(model_path: str, filepath: str, duration: float) -> Tuple[float, str]:
+    from vosk import Model
+    model = Model(model_path)
+    t0 = time.perf_counter()
+    text = decode_file(model, filepath)
+    return (time.perf_counter() - t0) / duration, text
+
+
+async def draft_under_load(filepath: str, refine_path: str, processes: int, duration: float) -> float:
+    draft = VoskExecutor(MODEL_PATH, 1)
+    refine = VoskExecutor(refine_path, processes, nice=REFINE_NICE)
+    draft.start()
+    refine.start()
+    try:
+        # Прогрев: модели грузятся в воркерах при первой задаче
+        await asyncio.gather(draft.decode(filepath), refine.decode(filepath))
+        background = [asyncio.ensure_future(refine.decode(filepath)) for _ in range(processes * 2)]
+        t0 = time.perf_counter()
+        await draft.decode(filepath)
+        elapsed = time.perf_counter() - t0
+        await asyncio.gather(*background)
+        return elapsed / duration
+    finally:
+        draft.stop()
+        refine.stop()
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    filepath = sys.argv[1]
+    refine_path = sys.argv[2] if len(sys.argv) > 2 else REFINE_PATH
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else max(1, (os.cpu_count() or 1) // 4)
+    for path in (MODEL_PATH, refine_path):
+        if not Path(path).is_dir():
+            print(f"Нет модели {path}")
+            return
+    duration = sf.info(filepath).duration
+    print(f"{filepath}: {duration:.0f} с")
+
+    draft_rtf, draft_text = rtf(MODEL_PATH, filepath, duration)
+    refine_rtf, refine_text = rtf(refine_path, filepath, duration)
+    print(f"черновик  {MODEL_PATH}: RTF {draft_rtf:.3f}")
+    print(f"уточнение {refine_path}: RTF {refine_rtf:.3f}")
+    print(f"расхождение черновика с уточнением (WER): {word_error_rate(refine_text, draft_text):.1%}")
+    loaded = asyncio.run(draft_under_load(filepath, refine_path, processes, duration))
+    print(f"черновик при {processes} процессах уточнения (nice {REFINE_NICE}): RTF {loaded:.3f}")
+
+
+if __name__ == "__main__":
+    main()